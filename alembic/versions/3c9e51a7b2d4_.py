@@ -0,0 +1,78 @@
+"""Store post text compressed.
+
+Revision ID: 3c9e51a7b2d4
+Revises: fd5535258428
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+from src.compression import compress, decompress
+
+# revision identifiers, used by Alembic.
+revision: str = "3c9e51a7b2d4"
+down_revision: str | None = "fd5535258428"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+BATCH_SIZE = 1000
+
+
+def upgrade() -> None:
+    """Upgrade database schema."""
+    op.alter_column(
+        "posts",
+        "text",
+        type_=sa.LargeBinary(),
+        postgresql_using="'\\x00'::bytea || convert_to(text, 'UTF8')",
+    )
+
+    bind = op.get_bind()
+    select = sa.text(
+        "SELECT id, text FROM posts WHERE id > :last_id "
+        "ORDER BY id LIMIT :limit",
+    )
+    update = sa.text("UPDATE posts SET text = :text WHERE id = :id")
+    last_id = 0
+    while rows := bind.execute(
+            select,
+            {"last_id": last_id, "limit": BATCH_SIZE},
+        ).all():
+        params = []
+        for post_id, text in rows:
+            packed = compress(decompress(text))
+            if packed != text:
+                params.append({"id": post_id, "text": packed})
+        if params:
+            bind.execute(update, params)
+        last_id = rows[-1][0]
+
+
+def downgrade() -> None:
+    """Downgrade database schema."""
+    bind = op.get_bind()
+    select = sa.text(
+        "SELECT id, text FROM posts WHERE id > :last_id "
+        "AND get_byte(text, 0) <> 0 ORDER BY id LIMIT :limit",
+    )
+    update = sa.text("UPDATE posts SET text = :text WHERE id = :id")
+    last_id = 0
+    while rows := bind.execute(
+            select,
+            {"last_id": last_id, "limit": BATCH_SIZE},
+        ).all():
+        bind.execute(update, [
+            {"id": post_id, "text": b"\x00" + decompress(text)}
+            for post_id, text in rows
+        ])
+        last_id = rows[-1][0]
+
+    op.alter_column(
+        "posts",
+        "text",
+        type_=sa.String(),
+        postgresql_using="convert_from(substring(text from 2), 'UTF8')",
+    )
@@ -0,0 +1,97 @@
+"""Benchmark for the HTTP and serialization layers.
+
+Runs requests against the application in process with the in-memory
+storage backend, so the numbers show framework overhead without any
+Postgres or Redis round trips.
+
+    STORAGE_BACKEND=memory REDIS_HOST= uv run python -m benchmarks.api
+"""
+
+
+import asyncio
+import sys
+import time
+from base64 import b64encode
+
+from httpx import ASGITransport, AsyncClient
+from pydantic import SecretStr
+
+from src import validators
+from src.main import app
+from src.memory import MemoryRepository
+from src.repository import get_repository
+
+REQUESTS = 2000
+
+repository = MemoryRepository()
+
+
+async def get_memory_repository() -> MemoryRepository:
+    """Return benchmark repository."""
+    return repository
+
+
+def auth(login: str, password: str) -> dict[str, str]:
+    """Build basic auth header."""
+    token = b64encode(f"{login}:{password}".encode()).decode()
+    return {"Authorization": f"Basic {token}"}
+
+
+async def measure(
+        client: AsyncClient,
+        name: str,
+        method: str,
+        url: str,
+        json: dict[str, str] | None = None,
+    ) -> None:
+    """Print mean latency of request."""
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        response = await client.request(method, url, json=json)
+        response.raise_for_status()
+    elapsed = (time.perf_counter() - start) / REQUESTS
+    sys.stdout.write(f"{name:<20} {elapsed * 1e6:10.2f} us\n")
+
+
+async def main() -> None:
+    """Run benchmark."""
+    app.dependency_overrides[get_repository] = get_memory_repository
+    await repository.create_user(validators.User(
+        login="admin",
+        password=SecretStr("admin"),
+        first_name="Admin",
+        last_name="Admin",
+        is_admin=True,
+    ))
+    headers = auth("admin", "admin")
+    transport = ASGITransport(app=app)
+    async with AsyncClient(
+            transport=transport,
+            base_url="http://benchmark",
+            headers=headers,
+        ) as client:
+        for number in range(100):
+            await client.post(
+                "/post/create/",
+                json={"title": f"Post {number}", "text": "text " * 100},
+            )
+        await measure(client, "help", "GET", "/help/")
+        await measure(client, "get post", "GET", "/post/get/1/")
+        await measure(
+            client,
+            "get post title",
+            "GET",
+            "/post/get/1/?fields=id,title",
+        )
+        await measure(client, "get all posts", "GET", "/post/get/all/")
+        await measure(
+            client,
+            "create post",
+            "POST",
+            "/post/create/",
+            json={"title": "Post", "text": "text"},
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
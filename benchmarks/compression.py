@@ -0,0 +1,83 @@
+"""Benchmark for post text compression.
+
+Compares stored size and encode/decode latency of raw, zlib and
+dictionary compressed post bodies. Samples are read from the files given
+on the command line, or generated when no files are given. Every tenth
+sample is held out to train the dictionary and the rest are measured.
+
+    uv run python -m benchmarks.compression [FILE ...]
+"""
+
+
+import random
+import sys
+import zlib
+from pathlib import Path
+from timeit import timeit
+
+from src import compression
+
+WORDS = [
+    "post", "service", "user", "title", "text", "image", "admin",
+    "request", "cache", "database", "redis", "postgres", "update",
+    "create", "delete", "value", "query", "worker", "event",
+]
+
+
+def generate(count: int, size: int) -> list[bytes]:
+    """Generate synthetic post bodies."""
+    rng = random.Random(0)  # noqa: S311
+    return [
+        " ".join(
+            rng.choice(WORDS) for _ in range(size // 6)
+        ).encode()
+        for _ in range(count)
+    ]
+
+
+def measure(name: str, samples: list[bytes], runs: int = 5) -> None:
+    """Print size ratio and latency for the current compression settings."""
+    packed = [compression.compress(sample) for sample in samples]
+    raw_size = sum(map(len, samples))
+    packed_size = sum(map(len, packed))
+    encode = timeit(
+        lambda: [compression.compress(sample) for sample in samples],
+        number=runs,
+    ) / runs / len(samples)
+    decode = timeit(
+        lambda: [compression.decompress(value) for value in packed],
+        number=runs,
+    ) / runs / len(samples)
+    sys.stdout.write(
+        f"{name:<12} size {packed_size:>10} / {raw_size:<10} "
+        f"ratio {packed_size / raw_size:6.3f} "
+        f"encode {encode * 1e6:8.2f} us "
+        f"decode {decode * 1e6:8.2f} us\n",
+    )
+
+
+def main() -> None:
+    """Run benchmark."""
+    if len(sys.argv) > 1:
+        samples = [Path(path).read_bytes() for path in sys.argv[1:]]
+    else:
+        samples = generate(1000, 256) + generate(1000, 4096)
+    training = samples[::10]
+    del samples[::10]
+
+    compression.COMPRESSION_THRESHOLD = -1
+    measure("raw", samples)
+
+    compression.COMPRESSION_THRESHOLD = 0
+    compression.dictionary = b""
+    measure("zlib", samples)
+
+    compression.dictionary = compression.train_dictionary(training)
+    compression.register_dictionary(compression.dictionary)
+    measure("zlib+dict", samples)
+
+    sys.stdout.write(f"zlib {zlib.ZLIB_RUNTIME_VERSION}\n")
+
+
+if __name__ == "__main__":
+    main()
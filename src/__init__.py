@@ -1 +1,5 @@
 """Service for managing posts."""
+
+from dotenv import load_dotenv
+
+load_dotenv()
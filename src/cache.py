@@ -0,0 +1,342 @@
+"""Module for fault tolerant access to the Redis cache."""
+
+
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from os import environ
+from typing import Any
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from src.sharding import HashRing
+
+REDIS_NODES = environ.get("REDIS_NODES", "")
+REDIS_HOST = environ.get("REDIS_HOST", "")
+REDIS_PORT = int(environ.get("REDIS_PORT", "6379"))
+REDIS_PASSWORD = environ.get("REDIS_PASSWORD")
+REDIS_CONNECT_TIMEOUT = float(environ.get("REDIS_CONNECT_TIMEOUT", "1"))
+REDIS_SOCKET_TIMEOUT = float(environ.get("REDIS_SOCKET_TIMEOUT", "5"))
+CACHE_TIMEOUT = float(environ.get("CACHE_TIMEOUT", "0.25"))
+BREAKER_FAILURES = int(environ.get("BREAKER_FAILURES", "5"))
+BREAKER_RESET_TIMEOUT = float(environ.get("BREAKER_RESET_TIMEOUT", "10"))
+REPLAY_LIMIT = int(environ.get("REPLAY_LIMIT", "10000"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+
+    """A class for cutting off calls to a failing dependency.
+
+    After ``failures`` consecutive errors the breaker opens and calls are
+    rejected without waiting. Once ``reset_timeout`` passes a single trial
+    call is let through; its outcome closes or reopens the breaker.
+    """
+
+    def __init__(
+            self,
+            failures: int = BREAKER_FAILURES,
+            reset_timeout: float = BREAKER_RESET_TIMEOUT,
+        ) -> None:
+        """Create CircuitBreaker object."""
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failure_count = 0
+        self.opened_at = 0.0
+        self.changed_at = time.time()
+        self.trial = False
+
+    def allow(self) -> bool:
+        """Check if call may be performed."""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.change(HALF_OPEN)
+        if self.trial:
+            return False
+        self.trial = True
+        return True
+
+    def success(self) -> None:
+        """Register successful call."""
+        self.failure_count = 0
+        self.trial = False
+        if self.state != CLOSED:
+            self.change(CLOSED)
+
+    def cancel(self) -> None:
+        """Forget call that ended without outcome, e.g. was cancelled."""
+        self.trial = False
+
+    def failure(self) -> None:
+        """Register failed call."""
+        self.failure_count += 1
+        self.trial = False
+        if self.state == HALF_OPEN or self.failure_count >= self.failures:
+            self.opened_at = time.monotonic()
+            if self.state != OPEN:
+                self.change(OPEN)
+
+    def change(self, state: str) -> None:
+        """Switch state."""
+        logging.warning("CACHE BREAKER: %s -> %s", self.state, state)
+        self.state = state
+        self.changed_at = time.time()
+
+
+class Cache:
+
+    """A class for Redis cache operations guarded by a circuit breaker.
+
+    Reads return ``None`` while the cache is unavailable so callers fall
+    back to the database. Failed writes after a change are skipped, and
+    the affected keys are remembered and deleted after the next
+    successful call, so no stale value outlives the failure. Fills after
+    a read miss are simply dropped, since they cannot leave a stale value
+    behind. A disabled cache never touches Redis.
+    """
+
+    def __init__(
+            self,
+            redis: Redis,
+            timeout: float = CACHE_TIMEOUT,
+            *,
+            enabled: bool = True,
+        ) -> None:
+        """Create Cache object."""
+        self.redis = redis
+        self.timeout = timeout
+        self.enabled = enabled
+        self.breaker = CircuitBreaker()
+        self.pending: set[str] = set()
+        self.overflow = False
+        self.replay_task: asyncio.Task[None] | None = None
+
+    async def call[T](
+            self,
+            operation: Callable[[], Awaitable[T]],
+        ) -> tuple[bool, T | None]:
+        """Run Redis operation through breaker."""
+        if not self.enabled or not self.breaker.allow():
+            return False, None
+        try:
+            async with asyncio.timeout(self.timeout):
+                result = await operation()
+        except (RedisError, TimeoutError, OSError) as error:
+            logging.warning("CACHE ERROR: %r", error)
+            self.breaker.failure()
+            return False, None
+        except BaseException:
+            self.breaker.cancel()
+            raise
+        self.breaker.success()
+        self.flush()
+        return True, result
+
+    def defer(self, *keys: str) -> None:
+        """Remember keys to invalidate after recovery."""
+        if not self.enabled:
+            return
+        if len(self.pending) + len(keys) > REPLAY_LIMIT:
+            if not self.overflow:
+                logging.warning("CACHE REPLAY: limit reached, dropping keys")
+                self.overflow = True
+            return
+        self.pending.update(keys)
+
+    def flush(self) -> None:
+        """Start replay of deferred keys unless it is running."""
+        if not self.pending:
+            return
+        if self.replay_task is None or self.replay_task.done():
+            self.replay_task = asyncio.create_task(self.replay())
+
+    async def replay(self) -> None:
+        """Delete keys whose write or invalidation failed."""
+        keys, self.pending = list(self.pending), set()
+        self.overflow = False
+        logging.info("CACHE REPLAY: %s keys", len(keys))
+        ok, _ = await self.call(lambda: self.redis.delete(*keys))
+        if not ok:
+            self.defer(*keys)
+
+    async def get(self, key: str) -> bytes | None:
+        """Get value or None if missing or cache is unavailable."""
+        _, value = await self.call(lambda: self.redis.get(key))
+        return value if isinstance(value, bytes) else None
+
+    async def get_many(self, keys: list[str]) -> dict[str, bytes | None]:
+        """Get many values with one MGET, all None if unavailable."""
+        if not keys:
+            return {}
+        _, values = await self.call(lambda: self.redis.mget(keys))
+        if values is None:
+            values = [None] * len(keys)
+        return {
+            key: value if isinstance(value, bytes) else None
+            for key, value in zip(keys, values, strict=True)
+        }
+
+    async def setex(self, key: str, ttl: int, value: bytes) -> None:
+        """Set changed value with expiration."""
+        ok, _ = await self.call(lambda: self.redis.setex(key, ttl, value))
+        if not ok:
+            self.defer(key)
+
+    async def fill(self, key: str, ttl: int, value: bytes) -> None:
+        """Cache value loaded after a miss, skipping it on failure."""
+        await self.call(lambda: self.redis.setex(key, ttl, value))
+
+    async def fill_many(self, items: dict[str, bytes], ttl: int) -> None:
+        """Cache many loaded values in one round trip."""
+        async def operation() -> list[Any]:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key, value in items.items():
+                    pipe.setex(key, ttl, value)
+                return await pipe.execute()
+
+        await self.call(operation)
+
+    async def delete(self, *keys: str) -> None:
+        """Delete keys."""
+        ok, _ = await self.call(lambda: self.redis.delete(*keys))
+        if not ok:
+            self.defer(*keys)
+
+    async def publish(self, channel: str, message: str) -> None:
+        """Publish message, skipping it while cache is unavailable."""
+        await self.call(lambda: self.redis.publish(channel, message))
+
+    def status(self) -> dict[str, Any]:
+        """Represent breaker state as dict."""
+        return {
+            "enabled": self.enabled,
+            "state": self.breaker.state,
+            "failures": self.breaker.failure_count,
+            "changed_at": self.breaker.changed_at,
+            "pending": len(self.pending),
+        }
+
+
+class ShardedCache:
+
+    """A class for a cache spread over several Redis nodes.
+
+    Keys are placed with consistent hashing and every node has its own
+    circuit breaker, so an outage of one node only bypasses its share of
+    the keys. Multi-key operations are split per node and sent
+    concurrently. Pub/sub and the job queue use the first node.
+    """
+
+    def __init__(self, nodes: dict[str, Cache]) -> None:
+        """Create ShardedCache object."""
+        self.nodes = nodes
+        self.ring = HashRing(nodes)
+        self.primary = next(iter(nodes.values()))
+        self.redis = self.primary.redis
+        self.enabled = self.primary.enabled
+
+    def node(self, key: str) -> Cache:
+        """Get node owning key."""
+        return self.nodes[self.ring.node(key)]
+
+    def add_node(self, name: str, node: Cache) -> None:
+        """Add node to the ring."""
+        self.nodes[name] = node
+        self.ring.add(name)
+
+    async def get(self, key: str) -> bytes | None:
+        """Get value or None if missing or node is unavailable."""
+        return await self.node(key).get(key)
+
+    async def setex(self, key: str, ttl: int, value: bytes) -> None:
+        """Set value with expiration."""
+        await self.node(key).setex(key, ttl, value)
+
+    async def get_many(self, keys: list[str]) -> dict[str, bytes | None]:
+        """Get many values with one MGET per node."""
+        values: dict[str, bytes | None] = {}
+        for reply in await asyncio.gather(*(
+            self.nodes[name].get_many(group)
+            for name, group in self.ring.group(keys).items()
+        )):
+            values.update(reply)
+        return values
+
+    async def fill(self, key: str, ttl: int, value: bytes) -> None:
+        """Cache value loaded after a miss."""
+        await self.node(key).fill(key, ttl, value)
+
+    async def fill_many(self, items: dict[str, bytes], ttl: int) -> None:
+        """Cache many loaded values with one pipeline per node."""
+        await asyncio.gather(*(
+            self.nodes[name].fill_many(
+                {key: items[key] for key in group},
+                ttl,
+            )
+            for name, group in self.ring.group(items).items()
+        ))
+
+    async def delete(self, *keys: str) -> None:
+        """Delete keys with one command per node."""
+        await asyncio.gather(*(
+            self.nodes[name].delete(*group)
+            for name, group in self.ring.group(keys).items()
+        ))
+
+    async def publish(self, channel: str, message: str) -> None:
+        """Publish message through the first node."""
+        await self.primary.publish(channel, message)
+
+    def status(self) -> dict[str, Any]:
+        """Represent state of all nodes as dict."""
+        return {
+            "enabled": self.enabled,
+            "nodes": {
+                name: node.status() for name, node in self.nodes.items()
+            },
+        }
+
+
+def parse_address(address: str) -> tuple[str, int]:
+    """Split host[:port] node address, defaulting to REDIS_PORT."""
+    host, separator, port = address.rpartition(":")
+    if not separator:
+        return address, REDIS_PORT
+    if not host or not port.isdigit():
+        msg = f"Invalid Redis node address: {address!r}"
+        raise ValueError(msg)
+    return host, int(port)
+
+
+def create_cache() -> ShardedCache:
+    """Create cache from REDIS_NODES or REDIS_HOST settings."""
+    addresses = [
+        address.strip()
+        for address in REDIS_NODES.split(",")
+        if address.strip()
+    ] or [f"{REDIS_HOST or 'localhost'}:{REDIS_PORT}"]
+    nodes = {}
+    for address in addresses:
+        host, port = parse_address(address)
+        redis = Redis(
+            host=host,
+            port=port,
+            password=REDIS_PASSWORD,
+            socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_keepalive=True,
+        )
+        nodes[address] = Cache(redis, enabled=bool(REDIS_NODES or REDIS_HOST))
+    return ShardedCache(nodes)
+
+
+cache = create_cache()
@@ -0,0 +1,166 @@
+"""Module for transparent compression of large values."""
+
+
+import zlib
+from collections import Counter
+from functools import cache
+from heapq import heapify, heappop, heappush
+from os import environ
+from pathlib import Path
+
+from sqlalchemy import Dialect, LargeBinary
+from sqlalchemy.types import TypeDecorator
+
+COMPRESSION_THRESHOLD = int(environ.get("COMPRESSION_THRESHOLD", "1024"))
+COMPRESSION_LEVEL = int(environ.get("COMPRESSION_LEVEL", "6"))
+COMPRESSION_DICTIONARY = environ.get("COMPRESSION_DICTIONARY", "")
+COMPRESSION_DICTIONARIES = environ.get("COMPRESSION_DICTIONARIES", "")
+
+RAW = b"\x00"
+ZLIB = b"\x01"
+ZLIB_DICTIONARY = b"\x02"
+DICTIONARY_SIZE = 32 * 1024
+SEGMENT_SIZE = 64
+KMER_SIZE = 8
+
+
+@cache
+def dictionary_id(data: bytes) -> bytes:
+    """Identify dictionary by its Adler-32 checksum."""
+    return zlib.adler32(data).to_bytes(4)
+
+
+def register_dictionary(data: bytes) -> None:
+    """Make dictionary known to decompress."""
+    dictionaries[dictionary_id(data)] = data
+
+
+dictionary = (
+    Path(COMPRESSION_DICTIONARY).read_bytes()
+    if COMPRESSION_DICTIONARY
+    else b""
+)
+dictionaries: dict[bytes, bytes] = {}
+for path in [COMPRESSION_DICTIONARY, *COMPRESSION_DICTIONARIES.split(",")]:
+    if path.strip():
+        register_dictionary(Path(path.strip()).read_bytes())
+
+
+def kmers(data: bytes) -> set[bytes]:
+    """Get all substrings of KMER_SIZE bytes."""
+    return {
+        data[index:index + KMER_SIZE]
+        for index in range(len(data) - KMER_SIZE + 1)
+    }
+
+
+def train_dictionary(
+        samples: list[bytes],
+        size: int = DICTIONARY_SIZE,
+    ) -> bytes:
+    """Build preset dictionary from sample values.
+
+    Samples are cut into overlapping segments scored by how many samples
+    share each of their short substrings. Segments are taken greedily,
+    and substrings already covered stop counting, so the dictionary holds
+    as much distinct shared content as possible. Deflate only looks back
+    32 KiB, so the best segments are placed at the end of the dictionary
+    where they are cheapest to reference.
+    """
+    frequency = Counter[bytes]()
+    for sample in samples:
+        frequency.update(kmers(sample))
+    frequency = Counter({
+        kmer: count for kmer, count in frequency.items() if count > 1
+    })
+
+    def score(segment: bytes) -> int:
+        return sum(frequency[kmer] for kmer in kmers(segment))
+
+    segments = dict.fromkeys(
+        sample[index:index + SEGMENT_SIZE]
+        for sample in samples
+        for index in range(0, len(sample), SEGMENT_SIZE // 2)
+    )
+    heap = [
+        (-score(segment), order, segment)
+        for order, segment in enumerate(segments)
+    ]
+    heapify(heap)
+    chosen: list[bytes] = []
+    length = 0
+    while heap and length < size:
+        _, order, segment = heappop(heap)
+        current = score(segment)
+        if current == 0:
+            continue
+        if heap and current < -heap[0][0]:
+            heappush(heap, (-current, order, segment))
+            continue
+        chosen.append(segment)
+        length += len(segment)
+        for kmer in kmers(segment):
+            frequency[kmer] = 0
+    return b"".join(reversed(chosen))[-size:]
+
+
+def compress(data: bytes) -> bytes:
+    """Compress data if it is larger than the threshold."""
+    if COMPRESSION_THRESHOLD < 0 or len(data) < COMPRESSION_THRESHOLD:
+        return RAW + data
+    if dictionary:
+        compressor = zlib.compressobj(COMPRESSION_LEVEL, zdict=dictionary)
+        marker = ZLIB_DICTIONARY + dictionary_id(dictionary)
+    else:
+        compressor = zlib.compressobj(COMPRESSION_LEVEL)
+        marker = ZLIB
+    packed = compressor.compress(data) + compressor.flush()
+    if len(packed) >= len(data):
+        return RAW + data
+    return marker + packed
+
+
+def decompress(data: bytes) -> bytes:
+    """Restore data produced by compress."""
+    marker, payload = data[:1], data[1:]
+    if marker == RAW:
+        return payload
+    if marker == ZLIB:
+        return zlib.decompress(payload)
+    if marker == ZLIB_DICTIONARY:
+        key, payload = payload[:4], payload[4:]
+        if key not in dictionaries:
+            msg = f"Unknown compression dictionary: {key.hex()}"
+            raise ValueError(msg)
+        decompressor = zlib.decompressobj(zdict=dictionaries[key])
+        return decompressor.decompress(payload) + decompressor.flush()
+    msg = f"Unknown compression marker: {marker!r}"
+    raise ValueError(msg)
+
+
+class CompressedText(TypeDecorator[str]):
+
+    """A class for text stored compressed in a binary column."""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(
+            self,
+            value: str | None,
+            _: Dialect,
+        ) -> bytes | None:
+        """Compress text before storing it."""
+        if value is None:
+            return None
+        return compress(value.encode())
+
+    def process_result_value(
+            self,
+            value: bytes | None,
+            _: Dialect,
+        ) -> str | None:
+        """Decompress text after loading it."""
+        if value is None:
+            return None
+        return decompress(value).decode()
@@ -1,190 +1,312 @@
 """Module for working with the database."""
 
 
+from collections.abc import Sequence
 from hashlib import sha3_512
 from os import environ
 
-from dotenv import load_dotenv
-from redis.asyncio import Redis
-from sqlalchemy import select
+from sqlalchemy import delete, select
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from ujson import dumps, loads
 
-from src import validators
-from src.models import Post, User
+from src import events, profiling, validators
+from src.cache import cache
+from src.compression import compress, decompress
+from src.models import Image, Post, User
 
-load_dotenv()
 
+def cache_dumps(data: dict[str, str]) -> bytes:
+    """Serialize entity for cache."""
+    return compress(dumps(data).encode())
 
-POSTGRES_USER = environ["POSTGRES_USER"]
-POSTGRES_PASSWORD = environ["POSTGRES_PASSWORD"]
-POSTGRES_DB = environ["POSTGRES_DB"]
-DB_PORT = environ["DB_PORT"]
-DB_HOST = environ["DB_HOST"]
-REDIS_HOST = environ["REDIS_HOST"]
-REDIS_PORT = int(environ["REDIS_PORT"])
-REDIS_PASSWORD = environ["REDIS_PASSWORD"]
-DATABASE_URL = f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{DB_HOST}:{DB_PORT}/{POSTGRES_DB}"
 
-redis = Redis(host=REDIS_HOST, port=REDIS_PORT, password=REDIS_PASSWORD)
-engine = create_async_engine(DATABASE_URL, echo=True)
-Session = async_sessionmaker(engine)
+def cache_loads(data: bytes) -> dict[str, str]:
+    """Deserialize entity from cache."""
+    if data.startswith(b"{"):
+        return loads(data)
+    return loads(decompress(data))
 
 
-async def is_admin(login: str, password: str) -> bool:
-    """Check if user is admin."""
-    async with Session.begin() as session:
-        password_hash = sha3_512(password.encode()).hexdigest()
-        stmt = select(User).column(User.is_admin).where(
-            User.login == login,
-            User.password == password_hash,
-        )
-        user = (await session.execute(stmt)).scalar_one()
-        return user.is_admin
+class PostgresRepository:
 
+    """A class for storing entities in Postgres with a Redis cache."""
 
-async def is_correct(login: str, password: str) -> int:
-    """Check if user credentials is correct."""
-    async with Session.begin() as session:
-        password_hash = sha3_512(password.encode()).hexdigest()
-        stmt = select(User).column(User.id).where(
-            User.login == login,
-            User.password == password_hash,
-        )
-        user = (await session.execute(stmt)).scalar_one()
-        return user.id
-
-
-async def create_user(user_data: validators.User) -> dict[str, str]:
-    """Create user in database."""
-    password_hash = sha3_512(
-        user_data.password.get_secret_value().encode(),
-    ).hexdigest()
-    async with Session.begin() as session:
-        user = User(
-            login=user_data.login,
-            password=password_hash,
-            first_name=user_data.first_name,
-            last_name=user_data.last_name,
-            is_admin=user_data.is_admin,
-        )
-        session.add(user)
-        await session.flush()
-        await session.refresh(user)
-        await redis.setex(f"user:{user.id}", 3600, dumps(user.as_dict()))
-        return user.as_dict()
-
-
-async def get_user(user_id: int) -> dict[str, str]:
-    """Get user from database."""
-    user = await redis.get(f"user:{user_id}")
-    if user:
-        return loads(user)
-
-    async with Session.begin() as session:
-        stmt = select(User).where(User.id == user_id)
-        user = (await session.execute(stmt)).scalar_one()
-        redis.setex(f"user:{user_id}", 3600, user.as_dict())
-        return user.as_dict()
-
-
-async def get_all_users() -> list[dict[str, str]]:
-    """Get all users from database."""
-    async with Session.begin() as session:
-        stmt = select(User)
-        users = (await session.execute(stmt)).scalars().all()
-        return [user.as_dict() for user in users]
-
-
-async def update_user(
-        user_id: int,
-        user_data: validators.User,
-    ) -> dict[str, str]:
-    """Update user in database."""
-    password_hash = sha3_512(
-        user_data.password.get_secret_value().encode(),
-    ).hexdigest()
-    async with Session.begin() as session:
-        stmt = select(User).where(User.id == user_id)
-        user = (await session.execute(stmt)).scalar_one()
-        user.login = user_data.login
-        user.password = password_hash
-        user.first_name = user_data.first_name
-        user.last_name = user_data.last_name
-        user.is_admin = user_data.is_admin
-        await redis.setex(f"user:{user_id}", 3600, dumps(user.as_dict()))
-        return user.as_dict()
-
-
-async def delete_user(user_id: int) -> dict[str, str]:
-    """Delete user from database."""
-    async with Session.begin() as session:
-        stmt = select(User).where(User.id == user_id)
-        user = (await session.execute(stmt)).scalar_one()
-        await session.delete(user)
-        await redis.delete(f"user:{user_id}")
-        return user.as_dict()
-
-
-async def create_post(
-        user_id: int,
-        post_data: validators.Post,
-    ) -> dict[str, str]:
-    """Create post in database."""
-    async with Session.begin() as session:
-        post = Post(
-            user_id=user_id,
-            title=post_data.title,
-            text=post_data.text,
+    supports_background_delete = True
+
+    def __init__(self) -> None:
+        """Create PostgresRepository object from environment."""
+        postgres_user = environ["POSTGRES_USER"]
+        postgres_password = environ["POSTGRES_PASSWORD"]
+        postgres_db = environ["POSTGRES_DB"]
+        db_port = environ["DB_PORT"]
+        db_host = environ["DB_HOST"]
+        database_url = (
+            f"postgresql+asyncpg://{postgres_user}:{postgres_password}"
+            f"@{db_host}:{db_port}/{postgres_db}"
         )
-        session.add(post)
-        await session.flush()
-        await session.refresh(post)
-        await redis.setex(f"post:{post.id}", 3600, dumps(post.as_dict()))
-        return post.as_dict()
-
-
-async def get_post(post_id: int) -> dict[str, str]:
-    """Get post from database."""
-    post = await redis.get(f"post:{post_id}")
-    if post:
-        return loads(post)
-
-    async with Session.begin() as session:
-        stmt = select(Post).where(Post.id == post_id)
-        post = (await session.execute(stmt)).scalar_one()
-        redis.setex(f"post:{post.id}", 3600, dumps(post.as_dict()))
-        return post.as_dict()
-
-
-async def get_all_posts() -> list[dict[str, str]]:
-    """Get all posts from database."""
-    async with Session.begin() as session:
-        stmt = select(Post)
-        posts = (await session.execute(stmt)).scalars().all()
-        return [post.as_dict() for post in posts]
-
-
-async def update_post(
-        user_id: int,
-        post_id: int,
-        post_data: validators.Post,
-    ) -> dict[str, str]:
-    """Update post in database."""
-    async with Session.begin() as session:
-        stmt = select(Post).where(Post.id == user_id, Post.user_id == user_id)
-        post = (await session.execute(stmt)).scalar_one()
-        post.title = post_data.title
-        post.text = post_data.text
-        await redis.setex(f"post:{post_id}", 3600, dumps(post.as_dict()))
-        return post.as_dict()
-
-
-async def delete_post(user_id: int, post_id: int) -> dict[str, str]:
-    """Delete post from database."""
-    async with Session.begin() as session:
-        stmt = select(Post).where(Post.id == post_id, Post.user_id == user_id)
-        post = (await session.execute(stmt)).scalar_one()
-        await session.delete(post)
-        await redis.delete(f"post:{post_id}")
-        return post.as_dict()
+        db_echo = environ.get("DB_ECHO", "0") == "1"
+
+        self.engine = create_async_engine(database_url, echo=db_echo)
+        self.session = async_sessionmaker(self.engine)
+        profiling.slow_queries.attach(self.engine.sync_engine)
+
+    async def is_admin(self, login: str, password: str) -> bool:
+        """Check if user is admin."""
+        async with self.session.begin() as session:
+            password_hash = sha3_512(password.encode()).hexdigest()
+            stmt = select(User).column(User.is_admin).where(
+                User.login == login,
+                User.password == password_hash,
+            )
+            user = (await session.execute(stmt)).scalar_one()
+            return user.is_admin
+
+    async def is_correct(self, login: str, password: str) -> int:
+        """Check if user credentials is correct."""
+        async with self.session.begin() as session:
+            password_hash = sha3_512(password.encode()).hexdigest()
+            stmt = select(User).column(User.id).where(
+                User.login == login,
+                User.password == password_hash,
+            )
+            user = (await session.execute(stmt)).scalar_one()
+            return user.id
+
+    async def create_user(
+            self,
+            user_data: validators.User,
+        ) -> dict[str, str]:
+        """Create user in database."""
+        password_hash = sha3_512(
+            user_data.password.get_secret_value().encode(),
+        ).hexdigest()
+        async with self.session.begin() as session:
+            user = User(
+                login=user_data.login,
+                password=password_hash,
+                first_name=user_data.first_name,
+                last_name=user_data.last_name,
+                is_admin=user_data.is_admin,
+            )
+            session.add(user)
+            await session.flush()
+            await session.refresh(user)
+            await cache.setex(
+                f"user:{user.id}",
+                3600,
+                cache_dumps(user.as_dict()),
+            )
+            return user.as_dict()
+
+    async def get_user(
+            self,
+            user_id: int,
+            fields: Sequence[str] | None = None,
+        ) -> dict[str, str]:
+        """Get user from database."""
+        user = await cache.get(f"user:{user_id}")
+        if user:
+            return validators.project(cache_loads(user), fields)
+
+        async with self.session.begin() as session:
+            stmt = select(User).where(User.id == user_id)
+            user = (await session.execute(stmt)).scalar_one()
+            await cache.fill(
+                f"user:{user_id}",
+                3600,
+                cache_dumps(user.as_dict()),
+            )
+            return validators.project(user.as_dict(), fields)
+
+    async def get_all_users(
+            self,
+            fields: Sequence[str] | None = None,
+        ) -> list[dict[str, str]]:
+        """Get all users from database."""
+        async with self.session.begin() as session:
+            if fields is not None:
+                stmt = select(*(User.__table__.c[field] for field in fields))
+                rows = (await session.execute(stmt)).mappings().all()
+                return [dict(row) for row in rows]
+            stmt = select(User)
+            users = (await session.execute(stmt)).scalars().all()
+            return [user.as_dict() for user in users]
+
+    async def update_user(
+            self,
+            user_id: int,
+            user_data: validators.User,
+        ) -> dict[str, str]:
+        """Update user in database."""
+        password_hash = sha3_512(
+            user_data.password.get_secret_value().encode(),
+        ).hexdigest()
+        async with self.session.begin() as session:
+            stmt = select(User).where(User.id == user_id)
+            user = (await session.execute(stmt)).scalar_one()
+            user.login = user_data.login
+            user.password = password_hash
+            user.first_name = user_data.first_name
+            user.last_name = user_data.last_name
+            user.is_admin = user_data.is_admin
+            await cache.setex(
+                f"user:{user_id}",
+                3600,
+                cache_dumps(user.as_dict()),
+            )
+            return user.as_dict()
+
+    async def delete_user(self, user_id: int) -> dict[str, str]:
+        """Delete user with all posts and images from database."""
+        async with self.session.begin() as session:
+            stmt = select(User).where(User.id == user_id)
+            user = (await session.execute(stmt)).scalar_one()
+            user_dict = user.as_dict()
+            post_ids = select(Post.id).where(Post.user_id == user_id)
+            await session.execute(
+                delete(Image).where(Image.post_id.in_(post_ids)),
+            )
+            delete_stmt = (
+                delete(Post).where(Post.user_id == user_id).returning(Post)
+            )
+            posts = [
+                post.as_dict() for post in await session.scalars(delete_stmt)
+            ]
+            await session.delete(user)
+            await cache.delete(
+                f"user:{user_id}",
+                *(f"post:{post['id']}" for post in posts),
+            )
+        for post in posts:
+            await events.publish(cache, "delete", post)
+        return user_dict
+
+    async def warm_post_cache(self) -> int:
+        """Load all posts into cache."""
+        async with self.session.begin() as session:
+            posts = (await session.execute(select(Post))).scalars().all()
+            await cache.fill_many(
+                {
+                    f"post:{post.id}": cache_dumps(post.as_dict())
+                    for post in posts
+                },
+                3600,
+            )
+            return len(posts)
+
+    async def create_post(
+            self,
+            user_id: int,
+            post_data: validators.Post,
+        ) -> dict[str, str]:
+        """Create post in database."""
+        async with self.session.begin() as session:
+            post = Post(
+                user_id=user_id,
+                title=post_data.title,
+                text=post_data.text,
+            )
+            session.add(post)
+            await session.flush()
+            await session.refresh(post)
+            post_dict = post.as_dict()
+            await cache.setex(f"post:{post.id}", 3600, cache_dumps(post_dict))
+        await events.publish(cache, "create", post_dict)
+        return post_dict
+
+    async def get_post(
+            self,
+            post_id: int,
+            fields: Sequence[str] | None = None,
+        ) -> dict[str, str]:
+        """Get post from database."""
+        post = await cache.get(f"post:{post_id}")
+        if post:
+            return validators.project(cache_loads(post), fields)
+
+        async with self.session.begin() as session:
+            stmt = select(Post).where(Post.id == post_id)
+            post = (await session.execute(stmt)).scalar_one()
+            await cache.fill(
+                f"post:{post.id}",
+                3600,
+                cache_dumps(post.as_dict()),
+            )
+            return validators.project(post.as_dict(), fields)
+
+    async def get_all_posts(
+            self,
+            fields: Sequence[str] | None = None,
+        ) -> list[dict[str, str]]:
+        """Get all posts, reading cached ones with one MGET per node."""
+        async with self.session.begin() as session:
+            if fields is not None:
+                stmt = select(*(Post.__table__.c[field] for field in fields))
+                rows = (await session.execute(stmt)).mappings().all()
+                return [dict(row) for row in rows]
+            post_ids = (await session.execute(select(Post.id))).scalars().all()
+            cached = await cache.get_many(
+                [f"post:{post_id}" for post_id in post_ids],
+            )
+            missing = [
+                post_id
+                for post_id in post_ids
+                if cached[f"post:{post_id}"] is None
+            ]
+            loaded: dict[int, dict[str, str]] = {}
+            if missing:
+                stmt = select(Post).where(Post.id.in_(missing))
+                loaded = {
+                    post.id: post.as_dict()
+                    for post in (await session.execute(stmt)).scalars()
+                }
+                await cache.fill_many(
+                    {
+                        f"post:{post_id}": cache_dumps(post)
+                        for post_id, post in loaded.items()
+                    },
+                    3600,
+                )
+
+        posts = []
+        for post_id in post_ids:
+            value = cached[f"post:{post_id}"]
+            if value is not None:
+                posts.append(cache_loads(value))
+            elif post_id in loaded:
+                posts.append(loaded[post_id])
+        return posts
+
+    async def update_post(
+            self,
+            user_id: int,
+            post_id: int,
+            post_data: validators.Post,
+        ) -> dict[str, str]:
+        """Update post in database."""
+        async with self.session.begin() as session:
+            stmt = select(Post).where(
+                Post.id == post_id,
+                Post.user_id == user_id,
+            )
+            post = (await session.execute(stmt)).scalar_one()
+            post.title = post_data.title
+            post.text = post_data.text
+            post_dict = post.as_dict()
+            await cache.setex(f"post:{post_id}", 3600, cache_dumps(post_dict))
+        await events.publish(cache, "update", post_dict)
+        return post_dict
+
+    async def delete_post(self, user_id: int, post_id: int) -> dict[str, str]:
+        """Delete post from database."""
+        async with self.session.begin() as session:
+            stmt = select(Post).where(
+                Post.id == post_id,
+                Post.user_id == user_id,
+            )
+            post = (await session.execute(stmt)).scalar_one()
+            post_dict = post.as_dict()
+            await session.delete(post)
+            await cache.delete(f"post:{post_id}")
+        await events.publish(cache, "delete", post_dict)
+        return post_dict
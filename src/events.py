@@ -0,0 +1,158 @@
+"""Module for streaming post events to subscribers."""
+
+
+import asyncio
+import logging
+from collections.abc import AsyncIterator
+from contextlib import suppress
+from os import environ
+
+from redis.exceptions import RedisError
+from ujson import dumps, loads
+
+from src.cache import ShardedCache
+
+POST_EVENTS_CHANNEL = environ.get("POST_EVENTS_CHANNEL", "posts:events")
+SUBSCRIBER_QUEUE_SIZE = int(environ.get("SUBSCRIBER_QUEUE_SIZE", "64"))
+KEEPALIVE_INTERVAL = float(environ.get("KEEPALIVE_INTERVAL", "15"))
+RECONNECT_DELAY = float(environ.get("RECONNECT_DELAY", "1"))
+EVENTS_POLL_TIMEOUT = float(environ.get("EVENTS_POLL_TIMEOUT", "1"))
+
+
+async def publish(
+        cache: ShardedCache,
+        event: str,
+        post: dict[str, str],
+    ) -> None:
+    """Publish post event to the events channel."""
+    await cache.publish(
+        POST_EVENTS_CHANNEL,
+        dumps({"event": event, "post": post}),
+    )
+
+
+class Subscriber:
+
+    """A class for a single events stream consumer."""
+
+    def __init__(self, author_id: int | None = None) -> None:
+        """Create Subscriber object."""
+        self.author_id = author_id
+        self.queue: asyncio.Queue[str | None] = asyncio.Queue(
+            SUBSCRIBER_QUEUE_SIZE,
+        )
+
+    def accepts(self, event: dict[str, dict[str, str]]) -> bool:
+        """Check if subscriber is interested in event."""
+        if self.author_id is None:
+            return True
+        return event["post"]["user_id"] == self.author_id
+
+    def close(self) -> None:
+        """Close subscriber stream, discarding pending events if needed."""
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class Broadcaster:
+
+    """A class for fanning out Redis channel messages to subscribers.
+
+    Each worker holds a single subscription to the channel and copies
+    every message into the bounded queues of its local subscribers.
+    A subscriber whose queue is full is dropped, so a slow consumer
+    never delays the others.
+    """
+
+    def __init__(self, cache: ShardedCache) -> None:
+        """Create Broadcaster object."""
+        self.cache = cache
+        self.subscribers: set[Subscriber] = set()
+        self.task: asyncio.Task[None] | None = None
+
+    def subscribe(self, author_id: int | None = None) -> Subscriber:
+        """Register new subscriber and start listening if needed."""
+        subscriber = Subscriber(author_id)
+        self.subscribers.add(subscriber)
+        if not self.cache.enabled:
+            return subscriber
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.listen())
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        """Remove subscriber."""
+        self.subscribers.discard(subscriber)
+
+    def dispatch(self, data: bytes) -> None:
+        """Send message to all interested subscribers."""
+        try:
+            message = data.decode()
+            event = loads(message)
+            interested = [
+                subscriber
+                for subscriber in list(self.subscribers)
+                if subscriber.accepts(event)
+            ]
+        except (ValueError, KeyError, TypeError) as error:
+            logging.warning("EVENTS: skipping malformed message %r", error)
+            return
+        for subscriber in interested:
+            try:
+                subscriber.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                logging.info("EVENTS: dropping slow subscriber")
+                self.unsubscribe(subscriber)
+                subscriber.close()
+
+    async def listen(self) -> None:
+        """Read messages from the events channel, reconnecting on errors.
+
+        Messages are polled with a timeout shorter than the socket one,
+        so a quiet channel is not mistaken for a dead connection.
+        """
+        while True:
+            try:
+                async with self.cache.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(POST_EVENTS_CHANNEL)
+                    while True:
+                        message = await pubsub.get_message(
+                            ignore_subscribe_messages=True,
+                            timeout=EVENTS_POLL_TIMEOUT,
+                        )
+                        if message is not None:
+                            self.dispatch(message["data"])
+            except (RedisError, OSError) as error:
+                logging.warning("EVENTS: %r", error)
+                await asyncio.sleep(RECONNECT_DELAY)
+
+    async def stop(self) -> None:
+        """Stop listening and close all subscribers."""
+        if self.task is not None:
+            self.task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self.task
+            self.task = None
+        for subscriber in self.subscribers:
+            subscriber.close()
+        self.subscribers.clear()
+
+    async def stream(self, author_id: int | None = None) -> AsyncIterator[str]:
+        """Yield events as Server-Sent Events frames."""
+        subscriber = self.subscribe(author_id)
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(
+                        subscriber.queue.get(),
+                        KEEPALIVE_INTERVAL,
+                    )
+                except TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if message is None:
+                    return
+                yield f"data: {message}\n\n"
+        finally:
+            self.unsubscribe(subscriber)
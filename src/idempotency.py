@@ -0,0 +1,125 @@
+"""Module for replaying responses of retried requests."""
+
+
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager, suppress
+from hashlib import sha256
+from os import environ
+from typing import Any
+
+from ujson import dumps, loads
+
+from src.cache import ShardedCache
+
+IDEMPOTENCY_TTL = int(environ.get("IDEMPOTENCY_TTL", "86400"))
+IDEMPOTENCY_LOCK_TTL = int(environ.get("IDEMPOTENCY_LOCK_TTL", "30"))
+IDEMPOTENCY_WAIT = float(environ.get("IDEMPOTENCY_WAIT", "10"))
+IDEMPOTENCY_POLL = float(environ.get("IDEMPOTENCY_POLL", "0.05"))
+
+IN_PROGRESS = "in_progress"
+DONE = "done"
+
+
+class IdempotencyStore:
+
+    """A class for keeping responses by idempotency key.
+
+    The first request with a key stores an in-progress marker, renewed
+    while the request runs; concurrent duplicates wait for it to be
+    replaced by the final response, or take the key over once it is
+    released. Keys are scoped by credentials, so clients cannot read
+    each other's responses.
+    """
+
+    def __init__(self, cache: ShardedCache) -> None:
+        """Create IdempotencyStore object."""
+        self.cache = cache
+
+    @staticmethod
+    def key(credentials: str, idempotency_key: str) -> str:
+        """Build Redis key for client provided idempotency key."""
+        scope = f"{credentials}:{idempotency_key}".encode()
+        return f"idempotency:{sha256(scope).hexdigest()}"
+
+    @staticmethod
+    def fingerprint(method: str, path: str, body: bytes) -> str:
+        """Hash request so key reuse with other data can be detected."""
+        return sha256(f"{method} {path} ".encode() + body).hexdigest()
+
+    async def acquire(self, key: str, fingerprint: str) -> bool | None:
+        """Mark key as in progress.
+
+        Returns True if this request owns the key, False if the key is
+        already taken and None if the cache is unavailable.
+        """
+        marker = dumps({"state": IN_PROGRESS, "fingerprint": fingerprint})
+        node = self.cache.node(key)
+        ok, acquired = await node.call(
+            lambda: node.redis.set(
+                key,
+                marker,
+                nx=True,
+                ex=IDEMPOTENCY_LOCK_TTL,
+            ),
+        )
+        if not ok:
+            return None
+        return bool(acquired)
+
+    async def refresh(self, key: str) -> None:
+        """Extend in-progress marker until cancelled."""
+        node = self.cache.node(key)
+        while True:
+            await asyncio.sleep(IDEMPOTENCY_LOCK_TTL / 3)
+            await node.call(
+                lambda: node.redis.expire(key, IDEMPOTENCY_LOCK_TTL),
+            )
+
+    @asynccontextmanager
+    async def hold(self, key: str) -> AsyncIterator[None]:
+        """Keep in-progress marker alive while the block runs."""
+        task = asyncio.create_task(self.refresh(key))
+        try:
+            yield
+        finally:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+    async def wait(self, key: str) -> dict[str, Any] | None:
+        """Wait for stored response of a concurrent request.
+
+        Returns None if the key was released, e.g. after a failure.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + IDEMPOTENCY_WAIT
+        while True:
+            value = await self.cache.get(key)
+            if value is None:
+                return None
+            entry: dict[str, Any] = loads(value)
+            if entry["state"] == DONE or loop.time() >= deadline:
+                return entry
+            await asyncio.sleep(IDEMPOTENCY_POLL)
+
+    async def save(
+            self,
+            key: str,
+            fingerprint: str,
+            status: int,
+            body: bytes,
+            media_type: str | None,
+        ) -> None:
+        """Store final response."""
+        await self.cache.setex(key, IDEMPOTENCY_TTL, dumps({
+            "state": DONE,
+            "fingerprint": fingerprint,
+            "status": status,
+            "body": body.decode(),
+            "media_type": media_type,
+        }).encode())
+
+    async def release(self, key: str) -> None:
+        """Drop in-progress marker so the request may be retried."""
+        await self.cache.delete(key)
@@ -0,0 +1,343 @@
+"""Module for deferred background jobs."""
+
+
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from os import environ
+from typing import Any, cast
+from uuid import uuid4
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from redis.typing import EncodableT, FieldT
+from ujson import dumps, loads
+
+JOB_QUEUE = "jobs:queue"
+JOB_PROCESSING = "jobs:processing"
+JOB_DELAYED = "jobs:delayed"
+JOB_TTL = int(environ.get("JOB_TTL", "86400"))
+JOB_MAX_RETRIES = int(environ.get("JOB_MAX_RETRIES", "5"))
+JOB_RETRY_DELAY = float(environ.get("JOB_RETRY_DELAY", "1"))
+JOB_LEASE = float(environ.get("JOB_LEASE", "30"))
+JOB_POLL_TIMEOUT = int(environ.get("JOB_POLL_TIMEOUT", "1"))
+WORKER_CONCURRENCY = int(environ.get("WORKER_CONCURRENCY", "8"))
+
+Handler = Callable[..., Awaitable[Any]]
+
+ENQUEUE_SCRIPT = """
+if KEYS[3] then
+    local existing = redis.call("GET", KEYS[3])
+    if existing and redis.call("EXISTS", "job:" .. existing) == 1 then
+        return existing
+    end
+    redis.call("SET", KEYS[3], ARGV[1], "EX", ARGV[2])
+end
+redis.call(
+    "HSET", KEYS[1],
+    "id", ARGV[1],
+    "name", ARGV[3],
+    "payload", ARGV[4],
+    "status", "queued",
+    "attempts", 0,
+    "dedup_key", ARGV[5]
+)
+redis.call("EXPIRE", KEYS[1], ARGV[2])
+redis.call("LPUSH", KEYS[2], ARGV[1])
+return ARGV[1]
+"""
+
+
+def decode(value: bytes | str) -> str:
+    """Convert Redis reply to string."""
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class JobType:
+
+    """A class for a registered job handler."""
+
+    def __init__(self, handler: Handler, concurrency: int) -> None:
+        """Create JobType object."""
+        self.handler = handler
+        self.concurrency = concurrency
+
+
+job_types: dict[str, JobType] = {}
+
+
+def job(
+        name: str,
+        concurrency: int = WORKER_CONCURRENCY,
+    ) -> Callable[[Handler], Handler]:
+    """Register job handler under name."""
+    def register(handler: Handler) -> Handler:
+        job_types[name] = JobType(handler, concurrency)
+        return handler
+    return register
+
+
+async def enqueue(
+        redis: Redis,
+        name: str,
+        payload: dict[str, Any],
+        dedup_key: str | None = None,
+    ) -> str:
+    """Put job into queue and return its id.
+
+    Jobs sharing a dedup key are collapsed into the first one until it
+    finishes. The check and the job creation run as one script, so an
+    interrupted call never leaves a dedup key without its job; a key
+    whose job has expired is taken over.
+    """
+    job_id = uuid4().hex
+    keys = [f"job:{job_id}", JOB_QUEUE]
+    if dedup_key is not None:
+        keys.append(f"jobs:dedup:{dedup_key}")
+    script = redis.register_script(ENQUEUE_SCRIPT)
+    result = await script(keys=keys, args=[
+        job_id,
+        JOB_TTL,
+        name,
+        dumps(payload),
+        dedup_key or "",
+    ])
+    return decode(result)
+
+
+async def get_job(redis: Redis, job_id: str) -> dict[str, Any] | None:
+    """Get job status."""
+    data = await redis.hgetall(f"job:{job_id}")
+    if not data:
+        return None
+    job: dict[str, Any] = {
+        decode(key): decode(value) for key, value in data.items()
+    }
+    job.pop("dedup_key")
+    job["payload"] = loads(job["payload"])
+    if "result" in job:
+        job["result"] = loads(job["result"])
+    return job
+
+
+class Worker:
+
+    """A class for processing queued jobs.
+
+    A worker runs a fixed number of consumers. Taken jobs are moved to a
+    processing list and hold a lease in the running set of their type,
+    which also caps how many jobs of the type run across all workers.
+    Jobs whose lease is not renewed, because their worker died, are put
+    back into the queue. Failed jobs are retried with exponential backoff
+    through a delayed set.
+    """
+
+    def __init__(
+            self,
+            redis: Redis,
+            concurrency: int = WORKER_CONCURRENCY,
+        ) -> None:
+        """Create Worker object."""
+        self.redis = redis
+        self.concurrency = concurrency
+
+    async def run(self) -> None:
+        """Process jobs until cancelled."""
+        async with asyncio.TaskGroup() as group:
+            group.create_task(self.schedule())
+            group.create_task(self.reap())
+            for _ in range(self.concurrency):
+                group.create_task(self.consume())
+
+    async def schedule(self) -> None:
+        """Move due delayed jobs back to the queue."""
+        while True:
+            try:
+                await self.move_due()
+            except (RedisError, OSError) as error:
+                logging.warning("JOB SCHEDULE: %r", error)
+            await asyncio.sleep(JOB_RETRY_DELAY / 2)
+
+    async def move_due(self) -> None:
+        """Move delayed jobs whose time has come to the queue."""
+        job_ids = cast(
+            "list[bytes]",
+            await self.redis.zrangebyscore(JOB_DELAYED, 0, time.time()),
+        )
+        for job_id in job_ids:
+            if await self.redis.zrem(JOB_DELAYED, job_id):
+                await self.redis.lpush(JOB_QUEUE, job_id)
+
+    async def reap(self) -> None:
+        """Requeue processing jobs without a live lease.
+
+        A job is requeued only when it has no lease on two passes in a
+        row, so a job that was just taken from the queue is left alone.
+        """
+        suspects: set[str] = set()
+        while True:
+            await asyncio.sleep(JOB_LEASE)
+            try:
+                suspects = await self.requeue_orphans(suspects)
+            except (RedisError, OSError) as error:
+                logging.warning("JOB REAP: %r", error)
+
+    async def requeue_orphans(self, suspects: set[str]) -> set[str]:
+        """Requeue suspects still without lease and return new ones."""
+        now = time.time()
+        orphans = set()
+        items = cast(
+            "list[bytes]",
+            await self.redis.lrange(JOB_PROCESSING, 0, -1),
+        )
+        for item in items:
+            job_id = decode(item)
+            name = await self.redis.hget(f"job:{job_id}", "name")
+            deadline = None if name is None else await self.redis.zscore(
+                f"jobs:running:{decode(name)}",
+                job_id,
+            )
+            if deadline is None or deadline < now:
+                orphans.add(job_id)
+        for job_id in orphans & suspects:
+            if await self.redis.lrem(JOB_PROCESSING, 1, job_id):
+                logging.warning("JOB LOST: %s", job_id)
+                await self.redis.lpush(JOB_QUEUE, job_id)
+        return orphans - suspects
+
+    async def consume(self) -> None:
+        """Take jobs from the queue one by one.
+
+        Redis errors only pause the consumer; a job interrupted by them
+        stays on the processing list until the reaper requeues it.
+        """
+        while True:
+            try:
+                job_id = await self.redis.blmove(
+                    JOB_QUEUE,
+                    JOB_PROCESSING,
+                    JOB_POLL_TIMEOUT,
+                    "RIGHT",
+                    "LEFT",
+                )
+                if job_id is not None:
+                    await self.process(decode(job_id))
+            except (RedisError, OSError) as error:
+                logging.warning("JOB CONSUME: %r", error)
+                await asyncio.sleep(JOB_RETRY_DELAY)
+
+    async def lease(self, job_id: str, name: str, limit: int) -> bool:
+        """Take a running slot of job type if one is free."""
+        running = f"jobs:running:{name}"
+        now = time.time()
+        async with self.redis.pipeline() as pipe:
+            pipe.zremrangebyscore(running, 0, now)
+            pipe.zadd(running, {job_id: now + JOB_LEASE})
+            pipe.zcard(running)
+            *_, count = await pipe.execute()
+        if count <= limit:
+            return True
+        await self.redis.zrem(running, job_id)
+        return False
+
+    async def heartbeat(self, job_id: str, name: str) -> None:
+        """Renew job lease while it runs."""
+        while True:
+            await asyncio.sleep(JOB_LEASE / 3)
+            try:
+                await self.redis.zadd(
+                    f"jobs:running:{name}",
+                    {job_id: time.time() + JOB_LEASE},
+                    xx=True,
+                )
+            except (RedisError, OSError) as error:
+                logging.warning("JOB HEARTBEAT: %s -> %r", job_id, error)
+
+    async def process(self, job_id: str) -> None:
+        """Run single job."""
+        key = f"job:{job_id}"
+        job = {
+            decode(field): decode(value)
+            for field, value in (await self.redis.hgetall(key)).items()
+        }
+        if not job:
+            await self.redis.lrem(JOB_PROCESSING, 1, job_id)
+            return
+        job_type = job_types.get(job["name"])
+        if job_type is None:
+            await self.settle(job_id, job, {
+                "status": "failed",
+                "error": "Unknown job",
+            })
+            return
+        if not await self.lease(job_id, job["name"], job_type.concurrency):
+            await self.settle(
+                job_id,
+                job,
+                {"status": "queued"},
+                delay=JOB_RETRY_DELAY,
+            )
+            return
+
+        attempts = int(job["attempts"]) + 1
+        if attempts > JOB_MAX_RETRIES + 1:
+            await self.settle(job_id, job, {
+                "status": "failed",
+                "error": "Worker lost",
+            })
+            return
+        await self.redis.hset(key, mapping={
+            "status": "running",
+            "attempts": attempts,
+        })
+        logging.info("JOB: %s -> %s -> %s", job["name"], job_id, attempts)
+        heartbeat = asyncio.create_task(self.heartbeat(job_id, job["name"]))
+        try:
+            result = await job_type.handler(**loads(job["payload"]))
+        except Exception as error:
+            logging.exception("JOB FAILED: %s -> %s", job["name"], job_id)
+            if attempts > JOB_MAX_RETRIES:
+                await self.settle(job_id, job, {
+                    "status": "failed",
+                    "error": repr(error),
+                })
+                return
+            await self.settle(
+                job_id,
+                job,
+                {"status": "retrying", "error": repr(error)},
+                delay=JOB_RETRY_DELAY * 2 ** (attempts - 1),
+            )
+            return
+        finally:
+            heartbeat.cancel()
+
+        await self.settle(job_id, job, {
+            "status": "done",
+            "result": dumps(result),
+        })
+
+    async def settle(
+            self,
+            job_id: str,
+            job: dict[str, str],
+            status: dict[FieldT, EncodableT],
+            delay: float | None = None,
+        ) -> None:
+        """Store job status and take it off the processing list.
+
+        Without delay the job is finished and its deduplication key is
+        released, otherwise it is scheduled to run again.
+        """
+        async with self.redis.pipeline() as pipe:
+            pipe.hset(f"job:{job_id}", mapping=status)
+            if status["status"] == "done":
+                pipe.hdel(f"job:{job_id}", "error")
+            if delay is not None:
+                pipe.zadd(JOB_DELAYED, {job_id: time.time() + delay})
+            elif job["dedup_key"]:
+                pipe.delete(f"jobs:dedup:{job['dedup_key']}")
+            pipe.zrem(f"jobs:running:{job['name']}", job_id)
+            pipe.lrem(JOB_PROCESSING, 1, job_id)
+            await pipe.execute()
@@ -1,18 +1,35 @@
 """Test task for web pages."""
 
 import logging
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
 from http import HTTPStatus
-from typing import Annotated
+from typing import Annotated, Any
 
 from fastapi import Depends, FastAPI, HTTPException, Request
-from fastapi.responses import UJSONResponse
+from fastapi.responses import Response, StreamingResponse, UJSONResponse
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from sqlalchemy.exc import IntegrityError, NoResultFound
 
-from src import database, validators
+from src import events, idempotency, jobs, profiling, validators
+from src.cache import cache
+from src.models import Post, User
+from src.repository import Repository, get_repository
 
-app = FastAPI()
+broadcaster = events.Broadcaster(cache)
+idempotency_store = idempotency.IdempotencyStore(cache)
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    """Release background resources on shutdown."""
+    yield
+    await broadcaster.stop()
+
+
+app = FastAPI(lifespan=lifespan)
 security = HTTPBasic()
+optional_security = HTTPBasic(auto_error=False)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -26,12 +43,16 @@ logging.basicConfig(
 
 async def check_admin(
         credentials: Annotated[HTTPBasicCredentials, Depends(security)],
+        repository: Annotated[Repository, Depends(get_repository)],
     ) -> str:
     """Check admin access."""
     logging.info("AUTHORIZATION: %s", credentials.username)
 
     try:
-        if await database.is_admin(credentials.username, credentials.password):
+        if await repository.is_admin(
+                credentials.username,
+                credentials.password,
+            ):
             return credentials.username
         raise HTTPException(HTTPStatus.UNAUTHORIZED)
     except NoResultFound:
@@ -40,12 +61,13 @@ async def check_admin(
 
 async def check_user(
         credentials: Annotated[HTTPBasicCredentials, Depends(security)],
+        repository: Annotated[Repository, Depends(get_repository)],
     ) -> int:
     """Check user access."""
     logging.info("AUTHORIZATION: %s", credentials.username)
 
     try:
-        return await database.is_correct(
+        return await repository.is_correct(
             credentials.username,
             credentials.password,
         )
@@ -53,6 +75,129 @@ async def check_user(
         raise HTTPException(HTTPStatus.UNAUTHORIZED) from None
 
 
+async def should_profile(request: Request) -> bool:
+    """Check if request must be profiled."""
+    if profiling.sampled():
+        return True
+    if request.headers.get("X-Profile") != "1":
+        return False
+
+    credentials = await optional_security(request)
+    if credentials is None:
+        return False
+    repository = await app.dependency_overrides.get(
+        get_repository,
+        get_repository,
+    )()
+    try:
+        return await repository.is_admin(
+            credentials.username,
+            credentials.password,
+        )
+    except NoResultFound:
+        return False
+
+
+@app.middleware("http")
+async def profile_request(
+        request: Request,
+        call_next: Callable[[Request], Awaitable[Response]],
+    ) -> Response:
+    """Write sampling profile of request if needed."""
+    if not await should_profile(request):
+        return await call_next(request)
+
+    profiler = profiling.start_profiler()
+    try:
+        return await call_next(request)
+    finally:
+        report = profiling.save_profile(
+            profiler,
+            request.method,
+            request.url.path,
+        )
+        logging.info("PROFILE: %s", report)
+
+
+def replay_response(entry: dict[str, Any], fingerprint: str) -> Response:
+    """Build response for request with already used idempotency key."""
+    if entry["fingerprint"] != fingerprint:
+        return UJSONResponse(
+            {"status": "error", "reason": "Idempotency key reused"},
+            HTTPStatus.UNPROCESSABLE_ENTITY,
+        )
+    if entry["state"] != idempotency.DONE:
+        return UJSONResponse(
+            {"status": "error", "reason": "Request in progress"},
+            HTTPStatus.CONFLICT,
+        )
+    return Response(
+        entry["body"],
+        entry["status"],
+        media_type=entry["media_type"],
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+async def read_body(response: Response) -> bytes:
+    """Read body of response, streamed or not."""
+    body_iterator = getattr(response, "body_iterator", None)
+    if body_iterator is None:
+        return bytes(response.body)
+    return b"".join([
+        chunk.encode() if isinstance(chunk, str) else bytes(chunk)
+        async for chunk in body_iterator
+    ])
+
+
+@app.middleware("http")
+async def replay_idempotent_request(
+        request: Request,
+        call_next: Callable[[Request], Awaitable[Response]],
+    ) -> Response:
+    """Run request once per Idempotency-Key and replay its response."""
+    idempotency_key = request.headers.get("Idempotency-Key")
+    if idempotency_key is None or request.method not in {"POST", "PUT"}:
+        return await call_next(request)
+
+    key = idempotency_store.key(
+        request.headers.get("Authorization", ""),
+        idempotency_key,
+    )
+    fingerprint = idempotency_store.fingerprint(
+        request.method,
+        request.url.path,
+        await request.body(),
+    )
+    while not (acquired := await idempotency_store.acquire(key, fingerprint)):
+        if acquired is None:
+            return await call_next(request)
+        entry = await idempotency_store.wait(key)
+        if entry is not None:
+            logging.info("IDEMPOTENT REPLAY: %s", idempotency_key)
+            return replay_response(entry, fingerprint)
+
+    async with idempotency_store.hold(key):
+        try:
+            response = await call_next(request)
+        except Exception:
+            await idempotency_store.release(key)
+            raise
+        if response.status_code >= HTTPStatus.INTERNAL_SERVER_ERROR:
+            await idempotency_store.release(key)
+            return response
+
+        body = await read_body(response)
+    await idempotency_store.save(
+        key,
+        fingerprint,
+        response.status_code,
+        body,
+        response.headers.get("Content-Type"),
+    )
+    return Response(body, response.status_code, dict(response.headers))
+
+
 @app.get("/help/")
 async def get_help() -> dict[str, str]:
     """Show info about service."""
@@ -66,6 +211,7 @@ async def get_help() -> dict[str, str]:
 async def create_user(
         request: Request,
         admin_username: Annotated[str, Depends(check_admin)],
+        repository: Annotated[Repository, Depends(get_repository)],
     ) -> UJSONResponse:
     """Create user and return info about it."""
     try:
@@ -80,7 +226,7 @@ async def create_user(
     logging.info("CREATE USER: %s -> %s", admin_username, user_data)
 
     try:
-        user = await database.create_user(user_data)
+        user = await repository.create_user(user_data)
     except IntegrityError:
         return UJSONResponse(
             {"status": "error", "reason": "User already exists"},
@@ -94,12 +240,22 @@ async def get_user(
         _: Request,
         user_id: int,
         admin_username: Annotated[str, Depends(check_admin)],
+        repository: Annotated[Repository, Depends(get_repository)],
+        fields: str | None = None,
     ) -> UJSONResponse:
     """Return info about user."""
+    try:
+        user_fields = validators.parse_fields(User, fields)
+    except ValueError:
+        return UJSONResponse(
+            {"status": "error", "reason": "Bad request"},
+            HTTPStatus.BAD_REQUEST,
+        )
+
     logging.info("GET USER: %s -> %s", admin_username, user_id)
 
     try:
-        user = await database.get_user(user_id)
+        user = await repository.get_user(user_id, user_fields)
     except NoResultFound:
         return UJSONResponse(
             {"status": "error", "reason": "User not found"},
@@ -112,10 +268,20 @@ async def get_user(
 async def get_all_users(
         _: Request,
         admin_username: Annotated[str, Depends(check_admin)],
+        repository: Annotated[Repository, Depends(get_repository)],
+        fields: str | None = None,
     ) -> UJSONResponse:
     """Return info about all users."""
+    try:
+        user_fields = validators.parse_fields(User, fields)
+    except ValueError:
+        return UJSONResponse(
+            {"status": "error", "reason": "Bad request"},
+            HTTPStatus.BAD_REQUEST,
+        )
+
     logging.info("GET ALL USERS: %s", admin_username)
-    users = await database.get_all_users()
+    users = await repository.get_all_users(user_fields)
     return UJSONResponse(users)
 
 
@@ -124,6 +290,7 @@ async def update_user(
         request: Request,
         user_id: int,
         admin_username: Annotated[str, Depends(check_admin)],
+        repository: Annotated[Repository, Depends(get_repository)],
     ) -> UJSONResponse:
     """Update user and return info about it."""
     try:
@@ -140,7 +307,7 @@ async def update_user(
     )
 
     try:
-        user = await database.update_user(user_id, user_data)
+        user = await repository.update_user(user_id, user_data)
     except NoResultFound:
         return UJSONResponse(
             {"status": "error", "reason": "User not found"},
@@ -154,24 +321,122 @@ async def delete_user(
         _: Request,
         user_id: int,
         admin_username: Annotated[str, Depends(check_admin)],
+        repository: Annotated[Repository, Depends(get_repository)],
     ) -> UJSONResponse:
-    """Delete user and return info about it."""
+    """Schedule user deletion and return job info.
+
+    Backends not shared with the worker and an unavailable queue delete
+    the user inline.
+    """
     logging.info("DELETE USER: %s -> %s", admin_username, user_id)
 
     try:
-        user = await database.delete_user(user_id)
+        user = await repository.get_user(user_id)
     except NoResultFound:
         return UJSONResponse(
             {"status": "error", "reason": "User not found"},
             HTTPStatus.NOT_FOUND,
         )
-    return UJSONResponse(user)
+    queued, job_id = False, None
+    if repository.supports_background_delete:
+        queued, job_id = await cache.primary.call(
+            lambda: jobs.enqueue(
+                cache.redis,
+                "delete_user",
+                {"user_id": user_id},
+                dedup_key=f"delete_user:{user_id}",
+            ),
+        )
+    if not queued:
+        return UJSONResponse(await repository.delete_user(user_id))
+    return UJSONResponse(
+        {"status": "accepted", "job_id": job_id, "user": user},
+        HTTPStatus.ACCEPTED,
+    )
+
+
+@app.get("/cache/status/")
+async def get_cache_status(
+        _: Request,
+        admin_username: Annotated[str, Depends(check_admin)],
+    ) -> UJSONResponse:
+    """Return cache circuit breaker state of this worker."""
+    logging.info("GET CACHE STATUS: %s", admin_username)
+    return UJSONResponse(cache.status())
+
+
+@app.post("/cache/warm/")
+async def warm_cache(
+        _: Request,
+        admin_username: Annotated[str, Depends(check_admin)],
+    ) -> UJSONResponse:
+    """Schedule post cache warmup and return job info."""
+    logging.info("WARM CACHE: %s", admin_username)
+    if not cache.enabled:
+        return UJSONResponse(
+            {"status": "error", "reason": "Cache is disabled"},
+            HTTPStatus.SERVICE_UNAVAILABLE,
+        )
+
+    queued, job_id = await cache.primary.call(
+        lambda: jobs.enqueue(
+            cache.redis,
+            "warm_post_cache",
+            {},
+            dedup_key="warm_post_cache",
+        ),
+    )
+    if not queued:
+        return UJSONResponse(
+            {"status": "error", "reason": "Cache is unavailable"},
+            HTTPStatus.SERVICE_UNAVAILABLE,
+        )
+    return UJSONResponse(
+        {"status": "accepted", "job_id": job_id},
+        HTTPStatus.ACCEPTED,
+    )
+
+
+@app.get("/debug/slow-queries/")
+async def get_slow_queries(
+        _: Request,
+        admin_username: Annotated[str, Depends(check_admin)],
+    ) -> UJSONResponse:
+    """Return latest slow queries of this worker."""
+    logging.info("GET SLOW QUERIES: %s", admin_username)
+    return UJSONResponse(list(profiling.slow_queries.queries))
+
+
+@app.get("/job/get/{job_id}/")
+async def get_job(
+        _: Request,
+        job_id: str,
+        admin_username: Annotated[str, Depends(check_admin)],
+    ) -> UJSONResponse:
+    """Return info about background job."""
+    logging.info("GET JOB: %s -> %s", admin_username, job_id)
+
+    ok, job = await cache.primary.call(
+        lambda: jobs.get_job(cache.redis, job_id),
+    )
+    if not ok and cache.enabled:
+        return UJSONResponse(
+            {"status": "error", "reason": "Cache is unavailable"},
+            HTTPStatus.SERVICE_UNAVAILABLE,
+        )
+    if job is None:
+        return UJSONResponse(
+            {"status": "error", "reason": "Job not found"},
+            HTTPStatus.NOT_FOUND,
+        )
+    return UJSONResponse(job)
 
 
 @app.post("/post/create/")
 async def create_post(
         request: Request,
         user_id: Annotated[int, Depends(check_user)],
+        repository: Annotated[Repository, Depends(get_repository)],
     ) -> UJSONResponse:
     """Create post and return info about it."""
     try:
@@ -184,7 +449,7 @@ async def create_post(
         )
 
     logging.info("CREATE POST: %s -> %s", user_id, post_data)
-    post = await database.create_post(user_id, post_data)
+    post = await repository.create_post(user_id, post_data)
     return UJSONResponse(post)
 
 
@@ -193,12 +458,22 @@ async def get_post(
         _: Request,
         post_id: int,
         user_id: Annotated[int, Depends(check_user)],
+        repository: Annotated[Repository, Depends(get_repository)],
+        fields: str | None = None,
     ) -> UJSONResponse:
     """Return info about post."""
+    try:
+        post_fields = validators.parse_fields(Post, fields)
+    except ValueError:
+        return UJSONResponse(
+            {"status": "error", "reason": "Bad request"},
+            HTTPStatus.BAD_REQUEST,
+        )
+
     logging.info("GET POST: %s -> %s", user_id, post_id)
 
     try:
-        post = await database.get_post(post_id)
+        post = await repository.get_post(post_id, post_fields)
     except NoResultFound:
         return UJSONResponse(
             {"status": "error", "reason": "Post not found"},
@@ -211,23 +486,49 @@ async def get_post(
 async def get_all_posts(
         _: Request,
         user_id: Annotated[int, Depends(check_user)],
+        repository: Annotated[Repository, Depends(get_repository)],
+        fields: str | None = None,
     ) -> UJSONResponse:
     """Return info about all posts."""
+    try:
+        post_fields = validators.parse_fields(Post, fields)
+    except ValueError:
+        return UJSONResponse(
+            {"status": "error", "reason": "Bad request"},
+            HTTPStatus.BAD_REQUEST,
+        )
+
     logging.info("GET ALL POSTS: %s", user_id)
-    posts = await database.get_all_posts()
+    posts = await repository.get_all_posts(post_fields)
     return UJSONResponse(posts)
 
 
+@app.get("/post/events/")
+async def get_post_events(
+        _: Request,
+        user_id: Annotated[int, Depends(check_user)],
+        author_id: int | None = None,
+    ) -> StreamingResponse:
+    """Stream post events as Server-Sent Events."""
+    logging.info("POST EVENTS: %s -> %s", user_id, author_id)
+    return StreamingResponse(
+        broadcaster.stream(author_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.put("/post/update/{post_id:int}/")
 async def update_post(
         request: Request,
         post_id: int,
         user_id: Annotated[int, Depends(check_user)],
+        repository: Annotated[Repository, Depends(get_repository)],
     ) -> UJSONResponse:
     """Update post and return info about it."""
     try:
         data = await request.json()
-        post_data = validators.User.model_validate(data)
+        post_data = validators.Post.model_validate(data)
     except ValueError:
         return UJSONResponse(
             {"status": "error", "reason": "Bad request"},
@@ -237,7 +538,7 @@ async def update_post(
     logging.info("UPDATE POST: %s -> %s -> %s", user_id, post_id, post_data)
 
     try:
-        post = await database.update_user(user_id, post_data)
+        post = await repository.update_post(user_id, post_id, post_data)
     except NoResultFound:
         return UJSONResponse(
             {"status": "error", "reason": "Post not found"},
@@ -251,12 +552,13 @@ async def delete_post(
         _: Request,
         post_id: int,
         user_id: Annotated[int, Depends(check_user)],
+        repository: Annotated[Repository, Depends(get_repository)],
     ) -> UJSONResponse:
     """Delete post and return info about it."""
     logging.info("DELETE USER: %s -> %s", user_id, post_id)
 
     try:
-        post = await database.delete_post(user_id, post_id)
+        post = await repository.delete_post(user_id, post_id)
     except NoResultFound:
         return UJSONResponse(
             {"status": "error", "reason": "Post not found"},
@@ -0,0 +1,208 @@
+"""Module for keeping entities in process memory."""
+
+
+from collections.abc import Sequence
+from hashlib import sha3_512
+from itertools import count
+from typing import Any
+
+from sqlalchemy.exc import IntegrityError, NoResultFound
+
+from src import events, validators
+from src.cache import ShardedCache
+
+
+class MemoryRepository:
+
+    """A class for storing entities in dicts.
+
+    Users are indexed by id and login, posts by id and author, so every
+    operation costs the same as a cache hit. Intended for tests and for
+    measuring the HTTP layer without Postgres and Redis. Post events are
+    published only if a cache is given.
+    """
+
+    supports_background_delete = False
+
+    def __init__(self, cache: ShardedCache | None = None) -> None:
+        """Create MemoryRepository object."""
+        self.cache = cache
+        self.users: dict[int, dict[str, Any]] = {}
+        self.logins: dict[str, int] = {}
+        self.posts: dict[int, dict[str, Any]] = {}
+        self.user_posts: dict[int, set[int]] = {}
+        self.user_ids = count(1)
+        self.post_ids = count(1)
+
+    async def publish(self, event: str, post: dict[str, Any]) -> None:
+        """Publish post event if events are enabled."""
+        if self.cache is not None:
+            await events.publish(self.cache, event, post)
+
+    def find_user(self, login: str, password: str) -> dict[str, Any]:
+        """Find user by credentials."""
+        user = self.users.get(self.logins.get(login, 0))
+        password_hash = sha3_512(password.encode()).hexdigest()
+        if user is None or user["password"] != password_hash:
+            raise NoResultFound
+        return user
+
+    def user(self, user_id: int) -> dict[str, Any]:
+        """Get stored user."""
+        if user_id not in self.users:
+            raise NoResultFound
+        return self.users[user_id]
+
+    def post(
+            self,
+            post_id: int,
+            user_id: int | None = None,
+        ) -> dict[str, Any]:
+        """Get stored post, optionally checking its author."""
+        post = self.posts.get(post_id)
+        if post is None or user_id not in {None, post["user_id"]}:
+            raise NoResultFound
+        return post
+
+    async def is_admin(self, login: str, password: str) -> bool:
+        """Check if user is admin."""
+        return bool(self.find_user(login, password)["is_admin"])
+
+    async def is_correct(self, login: str, password: str) -> int:
+        """Check if user credentials is correct."""
+        return int(self.find_user(login, password)["id"])
+
+    async def create_user(
+            self,
+            user_data: validators.User,
+        ) -> dict[str, str]:
+        """Create user in memory."""
+        if user_data.login in self.logins:
+            msg = "INSERT INTO users"
+            raise IntegrityError(msg, None, KeyError("login"))
+        user_id = next(self.user_ids)
+        user: dict[str, Any] = {
+            "id": user_id,
+            "login": user_data.login,
+            "password": sha3_512(
+                user_data.password.get_secret_value().encode(),
+            ).hexdigest(),
+            "first_name": user_data.first_name,
+            "last_name": user_data.last_name,
+            "is_admin": user_data.is_admin,
+        }
+        self.users[user_id] = user
+        self.logins[user_data.login] = user_id
+        self.user_posts[user_id] = set()
+        return dict(user)
+
+    async def get_user(
+            self,
+            user_id: int,
+            fields: Sequence[str] | None = None,
+        ) -> dict[str, str]:
+        """Get user from memory."""
+        return validators.project(dict(self.user(user_id)), fields)
+
+    async def get_all_users(
+            self,
+            fields: Sequence[str] | None = None,
+        ) -> list[dict[str, str]]:
+        """Get all users from memory."""
+        return [
+            validators.project(dict(user), fields)
+            for user in self.users.values()
+        ]
+
+    async def update_user(
+            self,
+            user_id: int,
+            user_data: validators.User,
+        ) -> dict[str, str]:
+        """Update user in memory."""
+        user = self.user(user_id)
+        owner = self.logins.get(user_data.login, user_id)
+        if owner != user_id:
+            msg = "UPDATE users"
+            raise IntegrityError(msg, None, KeyError("login"))
+        del self.logins[user["login"]]
+        self.logins[user_data.login] = user_id
+        user.update(
+            login=user_data.login,
+            password=sha3_512(
+                user_data.password.get_secret_value().encode(),
+            ).hexdigest(),
+            first_name=user_data.first_name,
+            last_name=user_data.last_name,
+            is_admin=user_data.is_admin,
+        )
+        return dict(user)
+
+    async def delete_user(self, user_id: int) -> dict[str, str]:
+        """Delete user with all posts from memory."""
+        user = self.user(user_id)
+        posts = [
+            self.posts.pop(post_id)
+            for post_id in sorted(self.user_posts.pop(user_id))
+        ]
+        del self.users[user_id]
+        del self.logins[user["login"]]
+        for post in posts:
+            await self.publish("delete", post)
+        return user
+
+    async def create_post(
+            self,
+            user_id: int,
+            post_data: validators.Post,
+        ) -> dict[str, str]:
+        """Create post in memory."""
+        post_id = next(self.post_ids)
+        post: dict[str, Any] = {
+            "id": post_id,
+            "title": post_data.title,
+            "text": post_data.text,
+            "user_id": user_id,
+        }
+        self.posts[post_id] = post
+        self.user_posts.setdefault(user_id, set()).add(post_id)
+        await self.publish("create", post)
+        return dict(post)
+
+    async def get_post(
+            self,
+            post_id: int,
+            fields: Sequence[str] | None = None,
+        ) -> dict[str, str]:
+        """Get post from memory."""
+        return validators.project(dict(self.post(post_id)), fields)
+
+    async def get_all_posts(
+            self,
+            fields: Sequence[str] | None = None,
+        ) -> list[dict[str, str]]:
+        """Get all posts from memory."""
+        return [
+            validators.project(dict(post), fields)
+            for post in self.posts.values()
+        ]
+
+    async def update_post(
+            self,
+            user_id: int,
+            post_id: int,
+            post_data: validators.Post,
+        ) -> dict[str, str]:
+        """Update post in memory."""
+        post = self.post(post_id, user_id)
+        post.update(title=post_data.title, text=post_data.text)
+        await self.publish("update", post)
+        return dict(post)
+
+    async def delete_post(self, user_id: int, post_id: int) -> dict[str, str]:
+        """Delete post from memory."""
+        post = self.post(post_id, user_id)
+        del self.posts[post_id]
+        self.user_posts[user_id].discard(post_id)
+        await self.publish("delete", post)
+        return post
@@ -9,6 +9,8 @@ from sqlalchemy.orm import (
     relationship,
 )
 
+from src.compression import CompressedText
+
 Base = declarative_base()
 
 
@@ -56,7 +58,7 @@ class Post(Base):
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     title: Mapped[str] = mapped_column()
-    text: Mapped[str] = mapped_column()
+    text: Mapped[str] = mapped_column(CompressedText())
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
 
     author: Mapped["User"] = relationship(back_populates="posts")
@@ -0,0 +1,155 @@
+"""Module for request profiling and slow query capture."""
+
+
+import logging
+import time
+from collections import deque
+from os import environ
+from pathlib import Path
+from random import SystemRandom
+from typing import Any
+
+from pyinstrument import Profiler
+from sqlalchemy import Connection, Engine, event
+from sqlalchemy.engine import ExceptionContext
+from sqlalchemy.engine.interfaces import DBAPICursor
+
+PROFILE_DIR = Path(environ.get("PROFILE_DIR", "./profiles"))
+PROFILE_SAMPLE_RATE = float(environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL = float(environ.get("PROFILE_INTERVAL", "0.001"))
+SLOW_QUERY_THRESHOLD = float(environ.get("SLOW_QUERY_THRESHOLD", "0.5"))
+SLOW_QUERY_EXPLAIN = environ.get("SLOW_QUERY_EXPLAIN", "0") == "1"
+SLOW_QUERY_LIMIT = int(environ.get("SLOW_QUERY_LIMIT", "100"))
+
+sampler = SystemRandom()
+
+
+class SlowQueryRecorder:
+
+    """A class for keeping the latest slow statements.
+
+    Statements running longer than the threshold are stored with their
+    parameters and, optionally, the plan of a repeated
+    ``EXPLAIN (ANALYZE, BUFFERS)`` run. Only ``SELECT`` statements are
+    explained because ``ANALYZE`` executes the statement again. Failed
+    statements are recorded with their error and never explained.
+    """
+
+    def __init__(
+            self,
+            threshold: float = SLOW_QUERY_THRESHOLD,
+            limit: int = SLOW_QUERY_LIMIT,
+            *,
+            explain: bool = SLOW_QUERY_EXPLAIN,
+        ) -> None:
+        """Create SlowQueryRecorder object."""
+        self.threshold = threshold
+        self.explain = explain
+        self.queries: deque[dict[str, Any]] = deque(maxlen=limit)
+
+    def attach(self, engine: Engine) -> None:
+        """Listen to statement execution of engine."""
+        event.listen(engine, "before_cursor_execute", self.before_execute)
+        event.listen(engine, "after_cursor_execute", self.after_execute)
+        event.listen(engine, "handle_error", self.handle_error)
+
+    def before_execute(self, conn: Connection, *_: object) -> None:
+        """Remember statement start time."""
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    def after_execute(
+            self,
+            conn: Connection,
+            _: DBAPICursor,
+            statement: str,
+            parameters: tuple[Any, ...] | dict[str, Any],
+            *__: object,
+        ) -> None:
+        """Record statement if it was slow."""
+        duration = time.perf_counter() - conn.info["query_start"].pop()
+        query = self.slow_query(statement, parameters, duration)
+        if query is None:
+            return
+        if self.explain and statement.lstrip().upper().startswith("SELECT"):
+            query["plan"] = self.explain_plan(conn, statement, parameters)
+        self.queries.append(query)
+
+    def handle_error(self, context: ExceptionContext) -> None:
+        """Record failed statement if it was slow."""
+        conn = context.connection
+        if conn is None or not conn.info.get("query_start"):
+            return
+        duration = time.perf_counter() - conn.info["query_start"].pop()
+        query = self.slow_query(
+            context.statement or "",
+            context.parameters,
+            duration,
+            repr(context.original_exception),
+        )
+        if query is not None:
+            self.queries.append(query)
+
+    def slow_query(
+            self,
+            statement: str,
+            parameters: object,
+            duration: float,
+            error: str | None = None,
+        ) -> dict[str, Any] | None:
+        """Describe statement if it ran longer than the threshold."""
+        if duration < self.threshold:
+            return None
+        logging.warning("SLOW QUERY: %.3fs -> %s", duration, statement)
+        return {
+            "time": time.time(),
+            "duration": duration,
+            "statement": statement,
+            "parameters": repr(parameters),
+            "error": error,
+            "plan": None,
+        }
+
+    @staticmethod
+    def explain_plan(
+            conn: Connection,
+            statement: str,
+            parameters: tuple[Any, ...] | dict[str, Any],
+        ) -> str | None:
+        """Run EXPLAIN for statement on the same connection."""
+        explain = conn.connection.cursor()
+        try:
+            explain.execute(
+                f"EXPLAIN (ANALYZE, BUFFERS) {statement}",
+                parameters,
+            )
+            return "\n".join(row[0] for row in explain.fetchall())
+        except Exception:
+            logging.exception("SLOW QUERY: failed to explain")
+            return None
+        finally:
+            explain.close()
+
+
+slow_queries = SlowQueryRecorder()
+
+
+def sampled() -> bool:
+    """Check if request is picked for profiling by sample rate."""
+    return sampler.random() < PROFILE_SAMPLE_RATE
+
+
+def start_profiler() -> Profiler:
+    """Start sampling profiler for the current request."""
+    profiler = Profiler(interval=PROFILE_INTERVAL, async_mode="enabled")
+    profiler.start()
+    return profiler
+
+
+def save_profile(profiler: Profiler, method: str, path: str) -> Path:
+    """Stop profiler and write its report."""
+    profiler.stop()
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    name = "_".join(part for part in path.split("/") if part) or "root"
+    report = PROFILE_DIR / f"{time.time_ns()}_{method}_{name}.html"
+    report.write_text(profiler.output_html(), encoding="utf-8")
+    return report
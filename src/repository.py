@@ -0,0 +1,109 @@
+"""Module for choosing the storage backend."""
+
+
+from collections.abc import Sequence
+from functools import cache
+from os import environ
+from typing import Protocol
+
+from src import validators
+from src.cache import cache as shared_cache
+from src.database import PostgresRepository
+from src.memory import MemoryRepository
+
+STORAGE_BACKEND = environ.get("STORAGE_BACKEND", "postgres")
+
+
+class Repository(Protocol):
+
+    """Interface of user and post storage.
+
+    Missing entities raise ``NoResultFound`` and duplicated logins raise
+    ``IntegrityError``, whatever the backend is. Backends shared with the
+    worker set ``supports_background_delete``, so deletions may be
+    queued as jobs.
+    """
+
+    supports_background_delete: bool
+
+    async def is_admin(self, login: str, password: str) -> bool:
+        """Check if user is admin."""
+
+    async def is_correct(self, login: str, password: str) -> int:
+        """Check if user credentials is correct."""
+
+    async def create_user(
+            self,
+            user_data: validators.User,
+        ) -> dict[str, str]:
+        """Create user."""
+
+    async def get_user(
+            self,
+            user_id: int,
+            fields: Sequence[str] | None = None,
+        ) -> dict[str, str]:
+        """Get user."""
+
+    async def get_all_users(
+            self,
+            fields: Sequence[str] | None = None,
+        ) -> list[dict[str, str]]:
+        """Get all users."""
+
+    async def update_user(
+            self,
+            user_id: int,
+            user_data: validators.User,
+        ) -> dict[str, str]:
+        """Update user."""
+
+    async def delete_user(self, user_id: int) -> dict[str, str]:
+        """Delete user with all posts."""
+
+    async def create_post(
+            self,
+            user_id: int,
+            post_data: validators.Post,
+        ) -> dict[str, str]:
+        """Create post."""
+
+    async def get_post(
+            self,
+            post_id: int,
+            fields: Sequence[str] | None = None,
+        ) -> dict[str, str]:
+        """Get post."""
+
+    async def get_all_posts(
+            self,
+            fields: Sequence[str] | None = None,
+        ) -> list[dict[str, str]]:
+        """Get all posts."""
+
+    async def update_post(
+            self,
+            user_id: int,
+            post_id: int,
+            post_data: validators.Post,
+        ) -> dict[str, str]:
+        """Update post."""
+
+    async def delete_post(self, user_id: int, post_id: int) -> dict[str, str]:
+        """Delete post."""
+
+
+@cache
+def create_repository() -> Repository:
+    """Create repository configured by STORAGE_BACKEND."""
+    if STORAGE_BACKEND == "memory":
+        return MemoryRepository(shared_cache)
+    if STORAGE_BACKEND == "postgres":
+        return PostgresRepository()
+    msg = f"Unknown storage backend: {STORAGE_BACKEND}"
+    raise ValueError(msg)
+
+
+async def get_repository() -> Repository:
+    """Return shared repository, override it to inject another one."""
+    return create_repository()
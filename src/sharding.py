@@ -0,0 +1,71 @@
+"""Module for distributing keys between nodes."""
+
+
+from bisect import bisect, insort
+from collections.abc import Iterable
+from hashlib import blake2b
+from os import environ
+
+VIRTUAL_NODES = int(environ.get("VIRTUAL_NODES", "160"))
+
+
+def key_hash(key: str) -> int:
+    """Hash key to a point on the ring."""
+    return int.from_bytes(blake2b(key.encode(), digest_size=8).digest())
+
+
+class HashRing:
+
+    """A class for consistent hashing with virtual nodes.
+
+    Every node is placed on the ring ``replicas`` times and a key belongs
+    to the first node point after its hash. Adding or removing one of
+    ``n`` nodes only moves about ``1 / n`` of the keys.
+    """
+
+    def __init__(
+            self,
+            nodes: Iterable[str] = (),
+            replicas: int = VIRTUAL_NODES,
+        ) -> None:
+        """Create HashRing object."""
+        self.replicas = replicas
+        self.points: list[int] = []
+        self.owners: dict[int, str] = {}
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: str) -> None:
+        """Place node on the ring."""
+        for replica in range(self.replicas):
+            point = key_hash(f"{node}#{replica}")
+            if point in self.owners:
+                continue
+            self.owners[point] = node
+            insort(self.points, point)
+
+    def remove(self, node: str) -> None:
+        """Take node off the ring."""
+        self.points = [
+            point for point in self.points if self.owners[point] != node
+        ]
+        self.owners = {
+            point: owner
+            for point, owner in self.owners.items()
+            if owner != node
+        }
+
+    def node(self, key: str) -> str:
+        """Get node owning key."""
+        if not self.points:
+            msg = "Hash ring is empty"
+            raise LookupError(msg)
+        index = bisect(self.points, key_hash(key)) % len(self.points)
+        return self.owners[self.points[index]]
+
+    def group(self, keys: Iterable[str]) -> dict[str, list[str]]:
+        """Split keys by owning node."""
+        groups: dict[str, list[str]] = {}
+        for key in keys:
+            groups.setdefault(self.node(key), []).append(key)
+        return groups
@@ -1,8 +1,12 @@
 """Module for validate input data."""
 
 
+from collections.abc import Sequence
+
 from pydantic import BaseModel, SecretStr
 
+from src.models import Base
+
 
 class User(BaseModel):
 
@@ -21,3 +25,30 @@ class Post(BaseModel):
 
     title: str
     text: str
+
+
+def parse_fields(
+        model: type[Base],
+        value: str | None,
+    ) -> tuple[str, ...] | None:
+    """Validate comma separated list of model columns."""
+    if value is None:
+        return None
+    names = tuple(dict.fromkeys(
+        name.strip() for name in value.split(",") if name.strip()
+    ))
+    unknown = set(names) - set(model.__table__.columns.keys())
+    if not names or unknown:
+        msg = f"Unknown fields: {', '.join(sorted(unknown))}"
+        raise ValueError(msg)
+    return names
+
+
+def project(
+        data: dict[str, str],
+        fields: Sequence[str] | None,
+    ) -> dict[str, str]:
+    """Keep only requested fields of entity."""
+    if fields is None:
+        return data
+    return {field: data[field] for field in fields}
@@ -0,0 +1,50 @@
+"""Background worker for deferred jobs."""
+
+import asyncio
+import logging
+
+from sqlalchemy.exc import NoResultFound
+
+from src import jobs
+from src.cache import cache
+from src.database import PostgresRepository
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s | %(message)s",
+    handlers=[
+        logging.StreamHandler(),
+        logging.FileHandler(filename="./worker.log", encoding="utf-8"),
+    ],
+)
+
+repository = PostgresRepository()
+
+
+@jobs.job("delete_user", concurrency=2)
+async def delete_user(user_id: int) -> dict[str, str] | None:
+    """Delete user with all posts and images.
+
+    A user that is already gone counts as deleted, so a job repeated
+    after a lost worker still succeeds.
+    """
+    try:
+        return await repository.delete_user(user_id)
+    except NoResultFound:
+        return None
+
+
+@jobs.job("warm_post_cache", concurrency=1)
+async def warm_post_cache() -> int:
+    """Load all posts into cache."""
+    return await repository.warm_post_cache()
+
+
+async def main() -> None:
+    """Run worker."""
+    logging.info("WORKER: started")
+    await jobs.Worker(cache.redis).run()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
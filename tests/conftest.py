@@ -0,0 +1,36 @@
+"""Shared fixtures of the tests."""
+
+
+import asyncio
+from collections.abc import Iterator
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import SecretStr
+
+from src import validators
+from src.main import app
+from src.memory import MemoryRepository
+from src.repository import get_repository
+
+
+@pytest.fixture
+def client() -> Iterator[TestClient]:
+    """Serve app with a fresh in-memory repository and an admin."""
+    repository = MemoryRepository()
+    asyncio.run(repository.create_user(validators.User(
+        login="admin",
+        password=SecretStr("admin"),
+        first_name="Admin",
+        last_name="Admin",
+        is_admin=True,
+    )))
+
+    async def get_memory_repository() -> MemoryRepository:
+        return repository
+
+    app.dependency_overrides[get_repository] = get_memory_repository
+    with TestClient(app) as test_client:
+        test_client.auth = ("admin", "admin")
+        yield test_client
+    app.dependency_overrides.clear()
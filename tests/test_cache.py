@@ -0,0 +1,117 @@
+"""Tests for the circuit breaker and deferred invalidation."""
+
+
+import asyncio
+import logging
+
+import pytest
+from fakeredis import FakeAsyncRedis
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from src import cache as cache_module
+from src.cache import CLOSED, HALF_OPEN, OPEN, Cache, CircuitBreaker
+
+
+def outage(cache: Cache) -> None:
+    """Open breaker of cache as if Redis were down."""
+    cache.breaker = CircuitBreaker(failures=1, reset_timeout=60)
+    cache.breaker.failure()
+
+
+def test_breaker_opens_after_failures() -> None:
+    """Reject calls once failures reach the limit."""
+    breaker = CircuitBreaker(failures=2, reset_timeout=60)
+    breaker.failure()
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+    breaker.failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+
+def test_breaker_trial() -> None:
+    """Let single trial through after reset timeout."""
+    breaker = CircuitBreaker(failures=1, reset_timeout=0)
+    breaker.failure()
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+    breaker.failure()
+    assert breaker.state == OPEN
+
+    assert breaker.allow()
+    breaker.success()
+    assert breaker.state == CLOSED
+    assert breaker.failure_count == 0
+
+
+def test_breaker_cancelled_trial() -> None:
+    """Release trial slot of a cancelled call."""
+    cache = Cache(FakeAsyncRedis())
+    cache.breaker = CircuitBreaker(failures=1, reset_timeout=0)
+    cache.breaker.failure()
+
+    async def run() -> None:
+        task = asyncio.create_task(cache.call(lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0)
+        assert cache.breaker.state == HALF_OPEN
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert cache.breaker.allow()
+
+    asyncio.run(run())
+
+
+def test_failed_write_is_replayed() -> None:
+    """Delete key of failed write after the next successful call."""
+    async def run() -> None:
+        redis = FakeAsyncRedis()
+        cache = Cache(redis)
+        await redis.set("post:1", b"stale")
+
+        async def setex(*_: object) -> None:
+            msg = "down"
+            raise RedisConnectionError(msg)
+
+        redis.setex = setex
+        await cache.setex("post:1", 60, b"new")
+        assert cache.pending == {"post:1"}
+
+        del redis.setex
+        await cache.get("post:2")
+        assert cache.replay_task is not None
+        await cache.replay_task
+        assert not cache.pending
+        assert await redis.get("post:1") is None
+
+    asyncio.run(run())
+
+
+def test_failed_fill_is_not_deferred() -> None:
+    """Remember changed keys but not fills after read misses."""
+    async def run() -> None:
+        cache = Cache(FakeAsyncRedis())
+        outage(cache)
+        await cache.fill("post:1", 60, b"value")
+        await cache.fill_many({"post:2": b"value"}, 60)
+        assert not cache.pending
+        await cache.setex("post:3", 60, b"value")
+        await cache.delete("post:4")
+        assert cache.pending == {"post:3", "post:4"}
+
+    asyncio.run(run())
+
+
+def test_replay_limit_is_logged_once(
+        monkeypatch: pytest.MonkeyPatch,
+        caplog: pytest.LogCaptureFixture,
+    ) -> None:
+    """Warn once when deferred keys overflow."""
+    monkeypatch.setattr(cache_module, "REPLAY_LIMIT", 1)
+    cache = Cache(FakeAsyncRedis())
+    with caplog.at_level(logging.WARNING):
+        for key in ("a", "b", "c"):
+            cache.defer(key)
+    assert cache.pending == {"a"}
+    assert caplog.text.count("limit reached") == 1
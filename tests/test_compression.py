@@ -0,0 +1,73 @@
+"""Tests for compression of stored values."""
+
+
+import pytest
+
+from src import compression
+
+TEXT = b"post text about cache and database " * 64
+
+
+@pytest.fixture(autouse=True)
+def settings(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Compress everything with an empty dictionary registry."""
+    monkeypatch.setattr(compression, "COMPRESSION_THRESHOLD", 0)
+    monkeypatch.setattr(compression, "dictionary", b"")
+    monkeypatch.setattr(compression, "dictionaries", {})
+
+
+def use_dictionary(monkeypatch: pytest.MonkeyPatch, data: bytes) -> None:
+    """Compress with dictionary from now on."""
+    monkeypatch.setattr(compression, "dictionary", data)
+    compression.register_dictionary(data)
+
+
+@pytest.mark.parametrize("data", [b"", b"short", TEXT])
+def test_round_trip(data: bytes) -> None:
+    """Restore compressed data."""
+    assert compression.decompress(compression.compress(data)) == data
+
+
+def test_small_values_stay_raw(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Keep values under threshold uncompressed."""
+    monkeypatch.setattr(compression, "COMPRESSION_THRESHOLD", 1024)
+    assert compression.compress(b"short") == compression.RAW + b"short"
+    assert compression.compress(TEXT).startswith(compression.ZLIB)
+
+
+def test_dictionary_rotation(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Decompress values written with a retired dictionary."""
+    use_dictionary(monkeypatch, b"post text about cache " * 16)
+    old = compression.compress(TEXT)
+    assert old.startswith(compression.ZLIB_DICTIONARY)
+
+    use_dictionary(monkeypatch, b"another dictionary " * 16)
+    new = compression.compress(TEXT)
+    assert old[1:5] != new[1:5]
+    assert compression.decompress(old) == TEXT
+    assert compression.decompress(new) == TEXT
+
+
+def test_unknown_dictionary(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Reject value written with a dictionary that is not known."""
+    use_dictionary(monkeypatch, b"post text about cache " * 16)
+    packed = compression.compress(TEXT)
+    compression.dictionaries.clear()
+    with pytest.raises(ValueError, match="Unknown compression dictionary"):
+        compression.decompress(packed)
+
+
+def test_unknown_marker() -> None:
+    """Reject value with unknown format marker."""
+    with pytest.raises(ValueError, match="Unknown compression marker"):
+        compression.decompress(b"\x7fdata")
+
+
+def test_train_dictionary() -> None:
+    """Build dictionary of content shared by samples."""
+    samples = [f"{index} {TEXT.decode()}".encode() for index in range(20)]
+    size = 512
+    trained = compression.train_dictionary(samples, size)
+    assert 0 < len(trained) <= size
+    assert b"cache and database" in trained
+    assert b"19 post" not in trained
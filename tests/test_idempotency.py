@@ -0,0 +1,87 @@
+"""Tests for replaying requests with an Idempotency-Key."""
+
+
+from base64 import b64encode
+from http import HTTPStatus
+
+import pytest
+from fakeredis import FakeAsyncRedis
+from fastapi.testclient import TestClient
+from ujson import dumps
+
+from src import idempotency, main
+from src.cache import Cache, ShardedCache
+
+BODY = dumps({
+    "login": "user",
+    "password": "user",
+    "first_name": "User",
+    "last_name": "User",
+    "is_admin": False,
+}).encode()
+USERS = 2
+
+
+@pytest.fixture
+def redis(monkeypatch: pytest.MonkeyPatch) -> FakeAsyncRedis:
+    """Keep idempotency keys in fake Redis."""
+    fake = FakeAsyncRedis()
+    store = idempotency.IdempotencyStore(ShardedCache({"fake": Cache(fake)}))
+    monkeypatch.setattr(main, "idempotency_store", store)
+    return fake
+
+
+def create_user(client: TestClient, body: bytes = BODY) -> dict[str, str]:
+    """Create user with idempotency key and return response."""
+    response = client.post(
+        "/user/create/",
+        content=body,
+        headers={"Idempotency-Key": "key"},
+    )
+    return {
+        "status": str(response.status_code),
+        "replayed": response.headers.get("Idempotent-Replayed", ""),
+        "body": response.text,
+    }
+
+
+@pytest.mark.usefixtures("redis")
+def test_replay(client: TestClient) -> None:
+    """Return stored response instead of running request again."""
+    first = create_user(client)
+    second = create_user(client)
+    assert first["status"] == str(HTTPStatus.OK.value)
+    assert second == {**first, "replayed": "true"}
+    assert len(client.get("/user/get/all/").json()) == USERS
+
+
+@pytest.mark.usefixtures("redis")
+def test_key_reused_with_other_body(client: TestClient) -> None:
+    """Reject key reused for another request."""
+    create_user(client)
+    response = create_user(client, BODY.replace(b"user", b"other"))
+    assert response["status"] == str(HTTPStatus.UNPROCESSABLE_ENTITY.value)
+    assert len(client.get("/user/get/all/").json()) == USERS
+
+
+def test_released_key_is_taken_over(
+        client: TestClient,
+        redis: FakeAsyncRedis,
+    ) -> None:
+    """Run request once the concurrent owner releases the key."""
+    credentials = b64encode(b"admin:admin").decode()
+    key = idempotency.IdempotencyStore.key(f"Basic {credentials}", "key")
+    fingerprint = idempotency.IdempotencyStore.fingerprint(
+        "POST",
+        "/user/create/",
+        BODY,
+    )
+    marker = dumps({
+        "state": idempotency.IN_PROGRESS,
+        "fingerprint": fingerprint,
+    })
+    client.portal.call(lambda: redis.set(key, marker, px=200))
+
+    response = create_user(client)
+    assert response["status"] == str(HTTPStatus.OK.value)
+    assert not response["replayed"]
@@ -0,0 +1,118 @@
+"""Tests for the background job queue."""
+
+
+import asyncio
+
+import pytest
+from fakeredis import FakeAsyncRedis
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from src import jobs
+
+attempts: list[int] = []
+
+
+@jobs.job("flaky")
+async def flaky(fail: int) -> int:
+    """Fail given number of times, then succeed."""
+    attempts.append(fail)
+    if len(attempts) <= fail:
+        msg = "boom"
+        raise RuntimeError(msg)
+    return len(attempts)
+
+
+@pytest.fixture
+def redis() -> FakeAsyncRedis:
+    """Create empty fake Redis."""
+    attempts.clear()
+    return FakeAsyncRedis()
+
+
+async def take(redis: FakeAsyncRedis) -> str:
+    """Move next job to the processing list the way consumers do."""
+    job_id = await redis.lmove(
+        jobs.JOB_QUEUE,
+        jobs.JOB_PROCESSING,
+        "RIGHT",
+        "LEFT",
+    )
+    assert job_id is not None
+    return jobs.decode(job_id)
+
+
+def test_enqueue_deduplicates(redis: FakeAsyncRedis) -> None:
+    """Collapse jobs with the same dedup key."""
+    async def run() -> None:
+        first = await jobs.enqueue(redis, "flaky", {"fail": 0}, "key")
+        second = await jobs.enqueue(redis, "flaky", {"fail": 0}, "key")
+        assert first == second
+        assert await redis.llen(jobs.JOB_QUEUE) == 1
+
+    asyncio.run(run())
+
+
+def test_enqueue_replaces_stale_dedup_key(redis: FakeAsyncRedis) -> None:
+    """Take over dedup key pointing at a missing job."""
+    async def run() -> None:
+        await redis.set("jobs:dedup:key", "deadbeef")
+        job_id = await jobs.enqueue(redis, "flaky", {"fail": 0}, "key")
+        assert job_id != "deadbeef"
+        assert await jobs.get_job(redis, job_id) is not None
+
+    asyncio.run(run())
+
+
+def test_retry_clears_error(
+        redis: FakeAsyncRedis,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+    """Drop error of failed attempt once job succeeds."""
+    monkeypatch.setattr(jobs, "JOB_RETRY_DELAY", 0)
+
+    async def run() -> None:
+        job_id = await jobs.enqueue(redis, "flaky", {"fail": 1}, "key")
+        worker = jobs.Worker(redis)
+        await worker.process(await take(redis))
+        job = await jobs.get_job(redis, job_id)
+        assert job is not None
+        assert job["status"] == "retrying"
+
+        await worker.move_due()
+        await worker.process(await take(redis))
+        job = await jobs.get_job(redis, job_id)
+        assert job is not None
+        assert job["status"] == "done"
+        assert "error" not in job
+        assert await redis.llen(jobs.JOB_PROCESSING) == 0
+        assert not await redis.exists("jobs:dedup:key")
+
+    asyncio.run(run())
+
+
+def test_consumer_survives_redis_errors(
+        redis: FakeAsyncRedis,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+    """Keep consuming after Redis error."""
+    monkeypatch.setattr(jobs, "JOB_RETRY_DELAY", 0)
+    calls = 0
+
+    async def blmove(*_: object) -> None:
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            msg = "blip"
+            raise RedisConnectionError(msg)
+        await asyncio.sleep(0)
+
+    monkeypatch.setattr(redis, "blmove", blmove)
+
+    async def run() -> None:
+        task = asyncio.create_task(jobs.Worker(redis).consume())
+        await asyncio.sleep(0.01)
+        assert not task.done()
+        assert calls > 1
+        task.cancel()
+
+    asyncio.run(run())
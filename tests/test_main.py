@@ -0,0 +1,123 @@
+"""Smoke tests of the API over the in-memory storage backend."""
+
+
+from http import HTTPStatus
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src import profiling
+
+USER = ("user", "user")
+
+
+def create_user(client: TestClient) -> int:
+    """Create regular user and return its id."""
+    response = client.post("/user/create/", json={
+        "login": USER[0],
+        "password": USER[1],
+        "first_name": "User",
+        "last_name": "User",
+        "is_admin": False,
+    })
+    assert response.status_code == HTTPStatus.OK
+    user_id: int = response.json()["id"]
+    return user_id
+
+
+def test_unauthorized(client: TestClient) -> None:
+    """Reject wrong credentials."""
+    response = client.get("/user/get/all/", auth=("admin", "wrong"))
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_users(client: TestClient) -> None:
+    """Create, read, update and delete user."""
+    user_id = create_user(client)
+    response = client.post("/user/create/", json={
+        "login": USER[0],
+        "password": USER[1],
+        "first_name": "User",
+        "last_name": "User",
+        "is_admin": False,
+    })
+    assert response.status_code == HTTPStatus.CONFLICT
+
+    response = client.get(f"/user/get/{user_id}/?fields=login,first_name")
+    assert response.json() == {"login": "user", "first_name": "User"}
+
+    response = client.put(f"/user/update/{user_id}/", json={
+        "login": USER[0],
+        "password": USER[1],
+        "first_name": "Renamed",
+        "last_name": "User",
+        "is_admin": False,
+    })
+    assert response.json()["first_name"] == "Renamed"
+
+    response = client.delete(f"/user/delete/{user_id}/")
+    assert response.status_code == HTTPStatus.OK
+    response = client.get(f"/user/get/{user_id}/")
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+
+def test_posts(client: TestClient) -> None:
+    """Create, read, update and delete post."""
+    user_id = create_user(client)
+    response = client.post(
+        "/post/create/",
+        json={"title": "Title", "text": "Text"},
+        auth=USER,
+    )
+    post = response.json()
+    assert post == {
+        "id": post["id"],
+        "title": "Title",
+        "text": "Text",
+        "user_id": user_id,
+    }
+
+    response = client.put(
+        f"/post/update/{post['id']}/",
+        json={"title": "Updated", "text": "Text"},
+        auth=USER,
+    )
+    assert response.json()["title"] == "Updated"
+    response = client.put(
+        f"/post/update/{post['id']}/",
+        json={"title": "Stolen", "text": "Text"},
+    )
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+    response = client.get("/post/get/all/?fields=id,title")
+    assert response.json() == [{"id": post["id"], "title": "Updated"}]
+    response = client.get("/post/get/all/?fields=id,unknown")
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+    response = client.delete(f"/post/delete/{post['id']}/", auth=USER)
+    assert response.status_code == HTTPStatus.OK
+    response = client.get(f"/post/get/{post['id']}/")
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+
+def test_delete_user_with_posts(client: TestClient) -> None:
+    """Delete posts of deleted user."""
+    create_user(client)
+    client.post("/post/create/", json={"title": "T", "text": "T"}, auth=USER)
+    response = client.delete("/user/delete/2/")
+    assert response.status_code == HTTPStatus.OK
+    assert client.get("/post/get/all/").json() == []
+
+
+def test_profile(
+        client: TestClient,
+        monkeypatch: pytest.MonkeyPatch,
+        tmp_path: Path,
+    ) -> None:
+    """Profile admin request through the overridden repository."""
+    monkeypatch.setattr(profiling, "PROFILE_DIR", tmp_path)
+    client.get("/help/", headers={"X-Profile": "1"}, auth=USER)
+    assert not list(tmp_path.iterdir())
+    client.get("/help/", headers={"X-Profile": "1"})
+    assert len(list(tmp_path.iterdir())) == 1
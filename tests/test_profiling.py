@@ -0,0 +1,38 @@
+"""Tests for the slow query recorder."""
+
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import IntegrityError
+
+from src.profiling import SlowQueryRecorder
+
+
+def test_failed_statements() -> None:
+    """Record failed statements without leaking start times."""
+    engine = create_engine("sqlite://")
+    recorder = SlowQueryRecorder(threshold=0)
+    recorder.attach(engine)
+    with engine.connect() as conn:
+        conn.execute(text("CREATE TABLE users (login TEXT PRIMARY KEY)"))
+        conn.execute(text("INSERT INTO users VALUES ('admin')"))
+        for _ in range(3):
+            with pytest.raises(IntegrityError):
+                conn.execute(text("INSERT INTO users VALUES ('admin')"))
+        assert not conn.info["query_start"]
+
+    *_, failed = recorder.queries
+    assert failed["statement"] == "INSERT INTO users VALUES ('admin')"
+    assert "IntegrityError" in failed["error"]
+    assert recorder.queries[0]["error"] is None
+
+
+def test_fast_statements_are_skipped() -> None:
+    """Keep only statements over the threshold."""
+    engine = create_engine("sqlite://")
+    recorder = SlowQueryRecorder(threshold=60)
+    recorder.attach(engine)
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        assert not conn.info["query_start"]
+    assert not recorder.queries
@@ -0,0 +1,66 @@
+"""Tests for the hash ring and per-node multi-key operations."""
+
+
+import asyncio
+from collections.abc import Awaitable, Callable
+
+from fakeredis import FakeAsyncRedis
+
+from src.cache import Cache, ShardedCache
+from src.sharding import HashRing
+
+KEYS = [f"post:{index}" for index in range(100_000)]
+NODES = ["redis-1", "redis-2", "redis-3", "redis-4"]
+CACHED = 10
+TOLERANCE = 0.05
+
+Mget = Callable[..., Awaitable[list[bytes | None]]]
+
+
+def test_adding_node_moves_its_share() -> None:
+    """Move about 1 / n of keys, all of them to the new node."""
+    ring = HashRing(NODES)
+    before = {key: ring.node(key) for key in KEYS}
+    ring.add("redis-5")
+    moved = {key for key in KEYS if ring.node(key) != before[key]}
+    share = len(moved) / len(KEYS)
+    assert abs(share - 1 / (len(NODES) + 1)) < TOLERANCE
+    assert {ring.node(key) for key in moved} == {"redis-5"}
+
+    ring.remove("redis-5")
+    assert all(ring.node(key) == before[key] for key in KEYS)
+
+
+def test_get_many_groups_keys_per_node() -> None:
+    """Send one MGET to every node owning some of the keys."""
+    async def run() -> None:
+        nodes = {name: Cache(FakeAsyncRedis()) for name in NODES[:2]}
+        cache = ShardedCache(nodes)
+        keys = KEYS[:20]
+        await cache.fill_many({key: key.encode() for key in keys[:CACHED]}, 60)
+        for name, group in cache.ring.group(keys[:CACHED]).items():
+            assert await nodes[name].redis.dbsize() == len(group)
+
+        calls = []
+        for name, node in nodes.items():
+            mget = node.redis.mget
+
+            async def counted(
+                    keys: list[str],
+                    name: str = name,
+                    mget: Mget = mget,
+                ) -> list[bytes | None]:
+                calls.append(name)
+                return await mget(keys)
+
+            node.redis.mget = counted  # type: ignore[method-assign]
+
+        values = await cache.get_many(keys)
+        assert sorted(calls) == sorted(NODES[:2])
+        assert values == {
+            key: key.encode() if index < CACHED else None
+            for index, key in enumerate(keys)
+        }
+        assert await cache.get_many([]) == {}
+
+    asyncio.run(run())